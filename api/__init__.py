@@ -2,23 +2,41 @@ from flask import Flask
 from dotenv import load_dotenv
 import logging
 import os
+import time
+from util import metrics
 from util.logger import setup_logging, logger
 from util.token import create_token_service
-from flask import request, jsonify
+from flask import request, jsonify, g
+
+# Paths served without an access token
+PUBLIC_PATHS = ('/version', '/metrics')
 
 def create_app():
     app = Flask(__name__)
-    auth_url = os.environ.get('AUTH_URL')
-    app_id = os.environ.get('APP_ID')
-    token_service = create_token_service(auth_url, app_id)
+    token_service = token_service_from_env()
     
     log_level = os.environ.get('LOG_LEVEL', 'INFO')
     setup_logging(getattr(logging, log_level.upper(), logging.INFO))
     
+    metrics.register_cache('token', token_service.cache_stats)
+
+    # Registered before the token check, so rejected requests are timed too
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        started = g.get('request_started')
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            metrics.REQUEST_LATENCY.labels(request.method, route, str(response.status_code)).observe(time.perf_counter() - started)
+        return response
+
     # Add access token check middleware
     @app.before_request
     def check_token():
-        if request.path == '/version':
+        if request.path in PUBLIC_PATHS:
             return None
         authorization = request.headers.get("Authorization")
         if authorization and authorization.startswith("Bearer "):
@@ -36,22 +54,52 @@ def create_app():
             return jsonify({'code': 401, 'message': 'Invalid access token'}), 401
     # Initialize services
     init_services()
+
+    # JSON encoder and compression of the responses
+    import api.response
+    api.response.register(app)
     
     # Register blueprints
     from api.jira_issue.route import jira_issue_bp
     app.register_blueprint(jira_issue_bp)
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        body, content_type = metrics.latest()
+        return body, 200, {'Content-Type': content_type}
    
     logger.info("Application initialized successfully")
     return app
 
+def token_service_from_env():
+    auth_url = os.environ.get('AUTH_URL')
+    app_id = os.environ.get('APP_ID')
+    return create_token_service(
+        auth_url,
+        app_id,
+        cache_size=int(os.environ.get('TOKEN_CACHE_SIZE', 10000)),
+        cache_max_ttl=float(os.environ.get('TOKEN_CACHE_MAX_TTL_SECONDS', 300)),
+        negative_cache_ttl=float(os.environ.get('TOKEN_NEGATIVE_CACHE_TTL_SECONDS', 30)),
+    )
+
 def init_services():
 
     # Load environment variables
     load_dotenv()
 
-    # Initialize ChromaDB using our db module
-    import db.chroma
-    db.chroma.init()
+    import api.response
+    api.response.init()
+
+    import db.sync_state
+    db.sync_state.init()
+
+    # Decides whether this process syncs and writes, or only reads
+    import db.leader
+    db.leader.init()
+
+    # Shared Bedrock client used by both suggestion and embedding
+    import models.bedrock
+    models.bedrock.init()
 
     import models.suggest
     models.suggest.init()
@@ -60,6 +108,14 @@ def init_services():
     # Initialize embedding model
     import models.embedding
     models.embedding.init()
+
+    # Initialize ChromaDB using our db module, after the embedding model it checks against
+    import db.chroma
+    db.chroma.init()
+
+    # Lexical index, built from the stored issues
+    import db.lexical
+    db.lexical.init()
     
     # Log successful initialization
     logger.info("All services initialized successfully")
@@ -0,0 +1,198 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse as StarletteJSONResponse, Response
+from starlette.routing import Route
+from api import response
+from util import metrics
+from util.logger import setup_logging, logger
+
+# Bounded pool for the blocking Chroma, Bedrock and Jira work of the handlers.
+# Its size is the number of requests a process works on at once.
+EXECUTOR = None
+# Blocking calls running or waiting for a thread, only changed on the event loop
+_blocking_calls = 0
+
+
+async def run_blocking(fn, *args):
+    """Run a blocking call on the bounded executor without blocking the event loop."""
+    global _blocking_calls
+    loop = asyncio.get_running_loop()
+    _blocking_calls += 1
+    try:
+        return await loop.run_in_executor(EXECUTOR, functools.partial(fn, *args))
+    finally:
+        _blocking_calls -= 1
+
+
+class JSONResponse(StarletteJSONResponse):
+    """JSONResponse that encodes with orjson when RESPONSE_FAST_JSON is enabled."""
+
+    def render(self, content):
+        if response.FAST_JSON:
+            return response.dumps(content)
+        return super().render(content)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing buffered responses with gzip or br.
+
+    Responses that are not compressible, like server-sent events, are passed
+    through untouched so they keep streaming.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        encoding = response.choose_encoding(Headers(scope=scope).get('accept-encoding'))
+        start = None
+        passthrough = False
+        chunks = []
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(raw=message['headers'])
+                if not response.is_compressible(headers.get('content-type'), headers.get('content-encoding')):
+                    passthrough = True
+                    await send(message)
+                    return
+                headers.add_vary_header('Accept-Encoding')
+                start = message
+                return
+            if passthrough or message['type'] != 'http.response.body':
+                await send(message)
+                return
+            chunks.append(message.get('body', b''))
+            if message.get('more_body', False):
+                return
+            body = b''.join(chunks)
+            if encoding is not None and len(body) >= response.COMPRESSION_MIN_BYTES:
+                body = response.compress(body, encoding)
+                headers = MutableHeaders(raw=start['headers'])
+                headers['Content-Encoding'] = encoding
+                headers['Content-Length'] = str(len(body))
+            await send(start)
+            await send({'type': 'http.response.body', 'body': body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording the latency of each request, until its response is complete."""
+
+    def __init__(self, app, paths):
+        self.app = app
+        # Only known paths become label values, anything else is 'unmatched'
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope['path'] if scope['path'] in self.paths else 'unmatched'
+            metrics.REQUEST_LATENCY.labels(scope['method'], route, str(status)).observe(time.perf_counter() - started)
+
+
+async def prometheus_metrics(request):
+    body, content_type = metrics.latest()
+    return Response(body, headers={'Content-Type': content_type})
+
+
+def create_asgi_app():
+    """
+    Create the ASGI application.
+
+    It serves the same endpoints as the Flask app from create_app, with async
+    handlers and token validation that does not block the event loop.
+    """
+    global EXECUTOR
+    from api import init_services, token_service_from_env, PUBLIC_PATHS
+    from api.jira_issue.asgi_route import routes
+    from api.jira_issue.service import start_background_sync, stop_background_sync
+
+    token_service = token_service_from_env()
+    metrics.register_cache('token', token_service.cache_stats)
+
+    log_level = os.environ.get('LOG_LEVEL', 'INFO')
+    setup_logging(getattr(logging, log_level.upper(), logging.INFO))
+
+    max_workers = int(os.environ.get('ASGI_WORKER_THREADS', 64))
+    if max_workers < 1:
+        raise ValueError(f"ASGI_WORKER_THREADS must be at least 1, got {max_workers}")
+    EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asgi')
+    logger.info(f"Running blocking handler work on {max_workers} threads")
+    metrics.register_gauge('issue_search_asgi_worker_threads', 'Threads for the blocking work of the ASGI handlers',
+                           lambda: max_workers)
+    metrics.register_gauge('issue_search_asgi_blocking_calls', 'Blocking ASGI handler calls running or waiting for a thread',
+                           lambda: _blocking_calls)
+
+    # Access token check middleware
+    async def check_token(request, call_next):
+        if request.url.path in PUBLIC_PATHS:
+            return await call_next(request)
+        authorization = request.headers.get("Authorization")
+        if authorization and authorization.startswith("Bearer "):
+            token = authorization[7:]
+        else:
+            logger.error('Access token is missing')
+            return JSONResponse({'code': 401, 'message': 'Access token is missing'}, status_code=401)
+        token_info = await token_service.aget_token_info(token)
+        if isinstance(token_info, str):
+            logger.error(token_info)
+            return JSONResponse({'code': 401, 'message': token_info}, status_code=401)
+        if not token_info.to_dict().get('user').get('id'):
+            logger.error('Invalid access token')
+            return JSONResponse({'code': 401, 'message': 'Invalid access token'}, status_code=401)
+        return await call_next(request)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        start_background_sync()
+        yield
+        stop_background_sync()
+        EXECUTOR.shutdown(wait=False)
+
+    # Initialize services
+    init_services()
+
+    routes = routes + [Route('/metrics', prometheus_metrics, methods=['GET'])]
+    middleware = [
+        Middleware(MetricsMiddleware, paths=[route.path for route in routes]),
+        Middleware(BaseHTTPMiddleware, dispatch=check_token),
+    ]
+    if response.COMPRESSION:
+        middleware.insert(1, Middleware(CompressionMiddleware))
+
+    app = Starlette(
+        routes=routes,
+        middleware=middleware,
+        lifespan=lifespan,
+    )
+    logger.info(f"ASGI application initialized with {max_workers} worker threads")
+    return app
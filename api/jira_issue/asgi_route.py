@@ -0,0 +1,134 @@
+from starlette.responses import StreamingResponse
+from starlette.routing import Route
+from api.asgi import run_blocking, JSONResponse
+from api.jira_issue import service
+from db import leader
+from api.jira_issue.route import format_sse, int_param, QUERY_BATCH_MAX_ITEMS
+from util.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Marks the end of a generator consumed with next() on the executor
+_END = object()
+
+
+async def sync(request):
+    full = request.query_params.get('full', 'false').lower() == 'true'
+    if not leader.is_leader():
+        return JSONResponse({'code': 409, 'message': 'This worker is a read-only follower, the sync leader syncs'}, status_code=409)
+    result = await run_blocking(service.sync_data, full)
+
+    updated = result.get('updated', [])
+    issues_count = result.get('total', 0)
+
+    logger.info(f"Sync complete. Updated: {len(updated)}, Skipped: {issues_count-len(updated)}")
+    return JSONResponse({'code': 0, 'message': f'Sync successfully. Updated: {len(updated)}, Skipped: {issues_count-len(updated)}', 'updated': updated})
+
+
+async def query(request):
+    key = request.query_params.get('key')
+    q = request.query_params.get('q')
+    fields = request.query_params.get('fields')
+    mode = request.query_params.get('mode', 'vector')
+    try:
+        n_results = int_param(request.query_params.get('n_results'), 'n_results', 5, minimum=1)
+        max_text_length = int_param(request.query_params.get('max_text_length'), 'max_text_length', minimum=0) or None
+        logger.info(f"Querying for key: {key}, query: {q}, n_results: {n_results}, mode: {mode}")
+        ret = await run_blocking(service.query_data, key, q, n_results, fields, max_text_length, mode)
+    except ValueError as e:
+        return JSONResponse({'code': 400, 'message': str(e)}, status_code=400)
+    if ret == []:
+        return JSONResponse({'code': 0, 'message': 'No Result'})
+    return JSONResponse({'code': 0, 'message': 'Query successfully', 'results': ret})
+
+
+async def query_batch(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        body = {}
+    if not isinstance(body, dict):
+        body = {}
+    items = body.get('items')
+    fields = body.get('fields')
+    if not isinstance(items, list) or not items:
+        return JSONResponse({'code': 400, 'message': "Missing 'items'"}, status_code=400)
+    if len(items) > QUERY_BATCH_MAX_ITEMS:
+        return JSONResponse({'code': 400, 'message': f"At most {QUERY_BATCH_MAX_ITEMS} items per batch"}, status_code=400)
+    try:
+        n_results = int_param(body.get('n_results'), 'n_results', 5, minimum=1)
+        max_text_length = int_param(body.get('max_text_length'), 'max_text_length', minimum=0) or None
+        logger.info(f"Batch querying {len(items)} items, n_results: {n_results}")
+        ret = await run_blocking(service.query_batch, items, n_results, fields, max_text_length)
+    except ValueError as e:
+        return JSONResponse({'code': 400, 'message': str(e)}, status_code=400)
+    return JSONResponse({'code': 0, 'message': 'Query successfully', 'results': ret})
+
+
+async def suggest(request):
+    key = request.query_params.get('key')
+    logger.info(f"Suggesting for key: {key}")
+    suggestion = await run_blocking(service.suggest_data, key)
+    if suggestion == []:
+        return JSONResponse({'code': 0, 'message': 'No Result'})
+    return JSONResponse({'code': 0, 'message': 'Suggest successfully', 'results': suggestion})
+
+
+async def suggest_stream(request):
+    key = request.query_params.get('key')
+    logger.info(f"Streaming suggestion for key: {key}")
+    events = await run_blocking(service.stream_suggest_data, key)
+    if events is None:
+        return JSONResponse({'code': 0, 'message': 'No Result'})
+
+    async def generate():
+        try:
+            while True:
+                # Each step waits on Bedrock, so it runs on the executor
+                item = await run_blocking(next, events, _END)
+                if item is _END:
+                    break
+                event, data = item
+                yield format_sse(event, data)
+        except Exception as e:
+            logger.error(f"Failed to stream suggestion for {key}: {e}", exc_info=True)
+            yield format_sse('error', {'message': 'Failed to generate suggestion'})
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def get(request):
+    assignee = request.query_params.get('assignee')
+    created_after = request.query_params.get('created_after')
+    cursor = request.query_params.get('cursor')
+    order = request.query_params.get('order', 'desc')
+    fields = request.query_params.get('fields')
+    try:
+        n_results = int_param(request.query_params.get('n_results'), 'n_results', 200, minimum=1)
+        max_text_length = int_param(request.query_params.get('max_text_length'), 'max_text_length', minimum=0) or None
+        logger.info(f"Getting issues for assignee: {assignee}, created_after: {created_after}, n_results: {n_results}, order: {order}")
+        results, next_cursor = await run_blocking(service.get_issues, assignee, created_after, n_results, cursor, order, fields, max_text_length)
+    except ValueError as e:
+        return JSONResponse({'code': 400, 'message': str(e)}, status_code=400)
+    if results == []:
+        return JSONResponse({'code': 0, 'message': 'No Result'})
+    return JSONResponse({'code': 0, 'message': 'Get successfully', 'results': results, 'next_cursor': next_cursor})
+
+
+async def version(request):
+    return JSONResponse({"release_version": "1.0.0.1000"})
+
+
+routes = [
+    Route('/sync', sync, methods=['POST']),
+    Route('/query', query, methods=['GET']),
+    Route('/query/batch', query_batch, methods=['POST']),
+    Route('/suggest', suggest, methods=['GET']),
+    Route('/suggest/stream', suggest_stream, methods=['GET']),
+    Route('/get_issues', get, methods=['GET']),
+    Route('/version', version, methods=['GET']),
+]
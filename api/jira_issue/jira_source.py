@@ -1,81 +1,198 @@
 import os
+import re
+import threading
+import concurrent.futures
+from collections import deque
 import pandas as pd
 from jira import JIRA
+from requests.adapters import HTTPAdapter
 import urllib3
 from util.logger import get_logger
 from util.txt_process import format_time_to_iso
+from datetime import datetime
+from zoneinfo import ZoneInfo
 # Get a logger for this module
 logger = get_logger(__name__)
 
-def fetch_by_query(query, num_of_issues_to_fetch=1000):
-    JIRA_URL = os.getenv('JIRA_URL')
-    JIRA_API_TOKEN = os.getenv('JIRA_API_TOKEN')
-    if not [JIRA_URL, JIRA_API_TOKEN]:
-        logger.error("JIRA_URL or JIRA_API_TOKEN not found in environment variables")
-        return None
+ISSUE_FIELDS = 'key,summary,status,description,created,issuetype,assignee,comment'
+
+_JIRA_CLIENT = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client():
+    """Get the process-wide Jira client, created on first use."""
+    global _JIRA_CLIENT
+    with _CLIENT_LOCK:
+        if _JIRA_CLIENT is None:
+            JIRA_URL = os.getenv('JIRA_URL')
+            JIRA_API_TOKEN = os.getenv('JIRA_API_TOKEN')
+            if not JIRA_URL or not JIRA_API_TOKEN:
+                logger.error("JIRA_URL or JIRA_API_TOKEN not found in environment variables")
+                return None
+
+            # Initialize JIRA client
+            jira_options = {'server': JIRA_URL, 'verify': False}
+            # This will suppress InsecureRequestWarning that comes from using verify=False
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+            client = JIRA(options=jira_options, token_auth=JIRA_API_TOKEN)
+
+            # Keep one pooled connection per concurrent page request
+            adapter = HTTPAdapter(pool_maxsize=_fetch_concurrency())
+            client._session.mount('https://', adapter)
+            client._session.mount('http://', adapter)
+            _JIRA_CLIENT = client
+        return _JIRA_CLIENT
+
+
+def _fetch_concurrency():
+    return max(1, int(os.getenv('JIRA_FETCH_CONCURRENCY', 4)))
+
 
-    # Initialize JIRA client
-    jira_options = {'server': JIRA_URL, 'verify': False}  
-    # This will suppress InsecureRequestWarning that comes from using verify=False
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-    JIRA_CLIENT = JIRA(options=jira_options, token_auth=JIRA_API_TOKEN)
+def fetch_by_query(query, num_of_issues_to_fetch=1000, updated_since=None):
+    """
+    Fetch issues matching a JQL query.
+
+    Args:
+        query (str): The JQL query.
+        num_of_issues_to_fetch (int): Maximum number of issues to fetch.
+        updated_since (float, optional): Unix timestamp; when given, only issues
+            updated at or after this time are fetched.
+
+    Returns:
+        list: A list of issue dictionaries.
+    """
+    if get_client() is None:
+        return None
 
-    # Initialization
     ret = []
-    start_at = 0
-    max_results = min(1000, num_of_issues_to_fetch)   # maximal result per api call is 1000
-    total = None
-    
-    # Continue fetching until we've got all results
-    while total is None or start_at < total:
-
-        # Fetch a batch of issues
-        issues = JIRA_CLIENT.search_issues(
-            query, 
-            startAt=start_at, 
-            maxResults=max_results, 
-            fields='key,summary,status,description,created,issuetype,assignee,comment'
-        )
-        
-        # If this is the first batch, get the total number of results
-        if total is None:  
-            total = min(num_of_issues_to_fetch, issues.total)
-    
-        # Process the current batch
-        for issue in issues:
-            issue_dict = create_issue_structure(issue)
-            if issue_dict:
-                ret.append(issue_dict)
-        
-        # If we got fewer results than requested, we're done
-        if len(issues) < max_results:
-            break
-        
-        # Move to the next batch
-        start_at += len(issues)
-        logger.info(f"Fetching {start_at} issues")
-        # Adjust max_results for the last batch
-        if total-start_at<max_results:
-            max_results=total-start_at
-        
+    for page in iter_pages(query, num_of_issues_to_fetch, updated_since):
+        ret.extend(page)
     return ret
 
 
+def iter_pages(query, num_of_issues_to_fetch=1000, updated_since=None):
+    """
+    Fetch issues matching a JQL query page by page.
+
+    The first page tells us the total, the remaining pages are fetched in
+    parallel. At most JIRA_FETCH_CONCURRENCY pages are fetched ahead of the
+    consumer, so a slow consumer holds back fetching instead of piling up pages.
+
+    Args:
+        query (str): The JQL query.
+        num_of_issues_to_fetch (int | None): Maximum number of issues to fetch,
+            None fetches every matching issue.
+        updated_since (float, optional): Unix timestamp; when given, only issues
+            updated at or after this time are fetched.
+
+    Yields:
+        list: The issue dictionaries of one page, pages are yielded in order.
+    """
+    if updated_since is not None:
+        query = build_incremental_query(query, updated_since)
+        logger.info(f"Incremental fetch with query: {query}")
+
+    client = get_client()
+    if client is None:
+        raise RuntimeError("Jira client is not configured")
+
+    page_size = int(os.getenv('JIRA_PAGE_SIZE', 100))
+    if num_of_issues_to_fetch is not None:
+        page_size = min(page_size, num_of_issues_to_fetch)
+    first_page = client.search_issues(query, startAt=0, maxResults=page_size, fields=ISSUE_FIELDS)
+    total = first_page.total if num_of_issues_to_fetch is None else min(num_of_issues_to_fetch, first_page.total)
+    yield [create_issue_structure(issue) for issue in first_page]
+    if not first_page or len(first_page) >= total:
+        return
+    # Jira may cap the page size below what we asked for
+    page_size = len(first_page)
+
+    def fetch_page(start_at):
+        issues = client.search_issues(
+            query,
+            startAt=start_at,
+            maxResults=min(page_size, total - start_at),
+            fields=ISSUE_FIELDS
+        )
+        return [create_issue_structure(issue) for issue in issues]
+
+    concurrency = _fetch_concurrency()
+    fetched = len(first_page)
+    pending = deque()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        try:
+            for start_at in range(page_size, total, page_size):
+                pending.append(executor.submit(fetch_page, start_at))
+                if len(pending) < concurrency:
+                    continue
+                page = pending.popleft().result()
+                fetched += len(page)
+                logger.info(f"Fetched {fetched}/{total} issues")
+                yield page
+            while pending:
+                page = pending.popleft().result()
+                fetched += len(page)
+                logger.info(f"Fetched {fetched}/{total} issues")
+                yield page
+        finally:
+            # Stop fetching ahead if the consumer gave up
+            for future in pending:
+                future.cancel()
+
+
+def build_incremental_query(query, updated_since):
+    """Restrict a JQL query to issues updated at or after `updated_since`."""
+    # JQL dates are interpreted in the Jira user's time zone
+    JIRA_TIMEZONE = os.getenv('JIRA_TIMEZONE')
+    tz = ZoneInfo(JIRA_TIMEZONE) if JIRA_TIMEZONE else None
+    since = datetime.fromtimestamp(updated_since, tz).strftime('%Y/%m/%d %H:%M')
+    clause = f'updated >= "{since}"'
+
+    # The ORDER BY clause has to stay at the end of the query
+    order_by = re.search(r'\border\s+by\b', query, re.IGNORECASE)
+    if order_by:
+        condition, order = query[:order_by.start()].strip(), ' ' + query[order_by.start():].strip()
+    else:
+        condition, order = query.strip(), ''
+
+    if condition:
+        return f'({condition}) AND {clause}{order}'
+    return f'{clause}{order}'
+
+
 def fetch_by_id(jira_id):
 
-    JIRA_URL = os.getenv('JIRA_URL')
-    JIRA_API_TOKEN = os.getenv('JIRA_API_TOKEN')
-    
-    jira_options = {'server': JIRA_URL, 'verify': False}
-    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-    JIRA_CLIENT = JIRA(options=jira_options, token_auth=JIRA_API_TOKEN)
+    client = get_client()
+    if client is None:
+        raise RuntimeError("Jira client is not configured")
     
     # Fetch the issue
-    issue = JIRA_CLIENT.issue(jira_id, fields='key,summary,status,description,created,issuetype,assignee,comment')
+    issue = client.issue(jira_id, fields=ISSUE_FIELDS)
             
     return create_issue_structure(issue)
 
 
+def fetch_by_ids(jira_ids):
+    """
+    Fetch many issues concurrently, JIRA_FETCH_CONCURRENCY at a time.
+
+    Returns:
+        list: The fetched issues in input order, ones that failed are logged and left out.
+    """
+    if not jira_ids:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(_fetch_concurrency(), len(jira_ids))) as executor:
+        futures = [executor.submit(fetch_by_id, jira_id) for jira_id in jira_ids]
+    issues = []
+    for jira_id, future in zip(jira_ids, futures):
+        try:
+            issues.append(future.result())
+        except Exception as e:
+            logger.error(f"Failed to fetch issue {jira_id}: {e}")
+    return issues
+
+
 def result_to_df(result):
     CSV_PATH = os.getenv('CSV_PATH')    
     if result:
@@ -91,8 +208,10 @@ def create_issue_structure(issue):
         assignee_name = issue.fields.assignee.name
     
     comment=""
+    comments = []
     for c in issue.fields.comment.comments:
         comment += f'{c.author.name}: {c.body}, '
+        comments.append({'id': c.id, 'author': c.author.name, 'body': c.body})
     
     created_at_iso = format_time_to_iso(issue.fields.created)
     issue_url = f"https://qnap-jira.qnap.com.tw/browse/{issue.key}"
@@ -103,6 +222,8 @@ def create_issue_structure(issue):
         'description': issue.fields.description,
         'created': created_at_iso,
         'comment': comment,
+        # Kept apart for comment chunks, 'comment' is what gets stored
+        'comments': comments,
         'comment_num':issue.fields.comment.total,
         'issuetype': issue.fields.issuetype.name,
         'assignee': assignee_name,
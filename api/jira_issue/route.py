@@ -1,15 +1,35 @@
-from flask import request, jsonify, Blueprint
+from flask import request, jsonify, Blueprint, Response, stream_with_context
+import json
 from api.jira_issue import service
+from db import leader
 from util.logger import get_logger
 
 
 jira_issue_bp = Blueprint('jira_issue', __name__)
 logger = get_logger(__name__)
 
+QUERY_BATCH_MAX_ITEMS = 100
+
+def int_param(value, name, default=None, minimum=None):
+    """Parse an integer request parameter, raises ValueError with a message for the client."""
+    if value is None or value == '':
+        return default
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be an integer")
+    if minimum is not None and number < minimum:
+        raise ValueError(f"'{name}' must be at least {minimum}")
+    return number
+
 @jira_issue_bp.route('/sync', methods=['POST'])
 def sync():
+    # Pass full=true to ignore the sync watermark and rescan every issue
+    full = request.args.get('full', 'false').lower() == 'true'
+    if not leader.is_leader():
+        return jsonify({'code': 409, 'message': 'This worker is a read-only follower, the sync leader syncs'}), 409
     # Call the service function to handle the sync logic
-    result = service.sync_data()
+    result = service.sync_data(full)
     
     # Extract the updated issues and total count from the result
     updated = result.get('updated', [])
@@ -23,13 +43,39 @@ def sync():
 def query():
     key = request.args.get('key')
     q = request.args.get('q')
-    n_results = int(request.args.get('n_results', 5))
-    logger.info(f"Querying for key: {key}, query: {q}, n_results: {n_results}")
-    ret = service.query_data(key, q, n_results)
+    fields = request.args.get('fields')
+    mode = request.args.get('mode', 'vector')
+    try:
+        n_results = int_param(request.args.get('n_results'), 'n_results', 5, minimum=1)
+        max_text_length = int_param(request.args.get('max_text_length'), 'max_text_length', minimum=0) or None
+        logger.info(f"Querying for key: {key}, query: {q}, n_results: {n_results}, mode: {mode}")
+        ret = service.query_data(key, q, n_results, fields, max_text_length, mode)
+    except ValueError as e:
+        return jsonify({'code': 400, 'message': str(e)}), 400
     if ret == []:
         return jsonify({'code': 0, 'message': 'No Result'})
     return jsonify({'code': 0, 'message': 'Query successfully', 'results': ret})
 
+@jira_issue_bp.route('/query/batch', methods=['POST'])
+def query_batch():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        body = {}
+    items = body.get('items')
+    fields = body.get('fields')
+    if not isinstance(items, list) or not items:
+        return jsonify({'code': 400, 'message': "Missing 'items'"}), 400
+    if len(items) > QUERY_BATCH_MAX_ITEMS:
+        return jsonify({'code': 400, 'message': f"At most {QUERY_BATCH_MAX_ITEMS} items per batch"}), 400
+    try:
+        n_results = int_param(body.get('n_results'), 'n_results', 5, minimum=1)
+        max_text_length = int_param(body.get('max_text_length'), 'max_text_length', minimum=0) or None
+        logger.info(f"Batch querying {len(items)} items, n_results: {n_results}")
+        ret = service.query_batch(items, n_results, fields, max_text_length)
+    except ValueError as e:
+        return jsonify({'code': 400, 'message': str(e)}), 400
+    return jsonify({'code': 0, 'message': 'Query successfully', 'results': ret})
+
 @jira_issue_bp.route('/suggest', methods=['GET'])
 def suggest():
     key=request.args.get('key')
@@ -39,16 +85,49 @@ def suggest():
         return jsonify({'code': 0, 'message': 'No Result'})
     return jsonify({'code': 0, 'message': 'Suggest successfully', 'results': suggestion})
 
+@jira_issue_bp.route('/suggest/stream', methods=['GET'])
+def suggest_stream():
+    key=request.args.get('key')
+    logger.info(f"Streaming suggestion for key: {key}")
+    events=service.stream_suggest_data(key)
+    if events is None:
+        return jsonify({'code': 0, 'message': 'No Result'})
+
+    def generate():
+        try:
+            for event, data in events:
+                yield format_sse(event, data)
+        except Exception as e:
+            logger.error(f"Failed to stream suggestion for {key}: {e}", exc_info=True)
+            yield format_sse('error', {'message': 'Failed to generate suggestion'})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        # Ask proxies not to buffer the stream
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @jira_issue_bp.route('/get_issues', methods=['GET'])
 def get():
     assignee = request.args.get('assignee')
     created_after = request.args.get('created_after')
-    n_results = int(request.args.get('n_results', 200))
-    logger.info(f"Getting issues for assignee: {assignee}, created_after: {created_after}, n_results: {n_results}")
-    results=service.get_issues(assignee, created_after, n_results)
+    cursor = request.args.get('cursor')
+    order = request.args.get('order', 'desc')
+    fields = request.args.get('fields')
+    try:
+        n_results = int_param(request.args.get('n_results'), 'n_results', 200, minimum=1)
+        max_text_length = int_param(request.args.get('max_text_length'), 'max_text_length', minimum=0) or None
+        logger.info(f"Getting issues for assignee: {assignee}, created_after: {created_after}, n_results: {n_results}, order: {order}")
+        results, next_cursor = service.get_issues(assignee, created_after, n_results, cursor, order, fields, max_text_length)
+    except ValueError as e:
+        return jsonify({'code': 400, 'message': str(e)}), 400
     if results == []:
         return jsonify({'code': 0, 'message': 'No Result'})
-    return jsonify({'code': 0, 'message': 'Get successfully', 'results': results})
+    return jsonify({'code': 0, 'message': 'Get successfully', 'results': results, 'next_cursor': next_cursor})
 
 @jira_issue_bp.route('/version', methods=['GET'])
 def version():
@@ -1,12 +1,16 @@
 import os
-from db.chroma import insert_or_replace_batch,insert_or_replace_one, get_one_by_key,query,get
+import base64
+import json
+from db.chroma import insert_or_replace_batch,insert_or_replace_one, get_one_by_key,query,query_many,get_page, get_metadatas_by_keys, get_embeddings_by_keys, update_metadata, chunking_enabled
+from db.sync_state import get_watermark, set_watermark
+from db import leader, lexical
 from util.txt_process import  format_value, document
-from api.jira_issue.jira_source import fetch_by_query, fetch_by_id
-from models.embedding import get_embedding_bedrock
-from models.suggest import  get_suggestion_bedrock
+from api.jira_issue.jira_source import iter_pages, fetch_by_id, fetch_by_ids
+from models.embedding import embed_text, embed_texts, get_query_embedding, get_query_embeddings
+from models.suggest import  get_suggestion_bedrock, stream_suggestion_bedrock, suggestion_cache_key
+from util import metrics
 from util.logger import get_logger
-import concurrent.futures
-from util.txt_process import format_time_to_txt, format_time_to_iso
+from util.txt_process import format_time_to_txt, format_time_to_iso, fingerprint
 import time 
 from threading import Thread 
 from datetime import datetime, timedelta 
@@ -18,49 +22,93 @@ _sync_thread = None
 _keep_sync_running = True 
 SYNC_INTERVAL_SECONDS = 3600 
 
+# Fields of an issue that responses can be limited to
+ISSUE_FIELDS = ('key', 'summary', 'url', 'assignee', 'issuetype', 'description', 'comment', 'status', 'created')
+# Query results can also include the vector distance, it is left out unless asked for
+QUERY_FIELDS = ISSUE_FIELDS + ('distance',)
+# Fields shortened by max_text_length
+LONG_TEXT_FIELDS = ('description', 'comment')
 
-def sync_data():
+# vector: embedding search, lexical: BM25 on the local index with no network call,
+# hybrid: both rankings fused with reciprocal rank fusion
+QUERY_MODES = ('vector', 'lexical', 'hybrid')
+# Reciprocal rank fusion constant, damps the weight of the top ranks of each ranking
+RRF_K = 60
+# Candidates taken from each ranking before fusion, as a multiple of n_results
+HYBRID_CANDIDATES_FACTOR = 4
+
+
+def sync_data(full=False):
     """
     Sync data from Jira to the local Chroma database.
-    
+
+    Only issues updated since the last successful sync of the same JQL query
+    are fetched, unless `full` is set or the query was never synced.
+
+    Each fetched page is diffed as soon as it arrives, and changed issues are
+    embedded and stored in chunks of SYNC_CHUNK_SIZE, so memory stays bounded
+    and a failure only loses the chunk in progress.
+
+    Args:
+        full (bool): Ignore the sync watermark and scan every matching issue.
+
     Returns:
         dict: A dictionary containing the sync results with keys:
             - updated: list of updated issue keys
             - total: total number of issues processed
     """
+    # The sync state and the store are shared with the other workers, only the leader moves them
+    leader.check_writable()
     jira_query=os.getenv('JIRA_QUERY')
     fetch_size=int(os.getenv('FETCH_SIZE'))
+    chunk_size=int(os.getenv('SYNC_CHUNK_SIZE', 200))
+    # Re-fetch a few minutes before the watermark to cover clock skew between us and Jira
+    overlap_seconds=int(os.getenv('SYNC_OVERLAP_MINUTES', 10)) * 60
 
-    logger.info("Starting Jira data sync...")
-    issues = fetch_by_query(jira_query,fetch_size)
-    # result_to_df(issues)
-    
-    # Issues that need to be updated
-    to_update = []
+    sync_started = time.time()
+    watermark = None if full else get_watermark(jira_query)
+    if watermark is None:
+        logger.info("Starting full Jira data sync...")
+        pages = iter_pages(jira_query,fetch_size)
+    else:
+        logger.info(f"Starting incremental Jira data sync from {format_time_to_txt(watermark)}...")
+        # Not capped by FETCH_SIZE, issues past the cap would be skipped for good once the watermark moves
+        pages = iter_pages(jira_query,None,updated_since=watermark-overlap_seconds)
+
+    total = 0
     updated = []
-    
-    # First pass: identify all issues that need updating
-    logger.info("Identifying issues that need updating...")
-    with concurrent.futures.ThreadPoolExecutor(max_workers=min(100, fetch_size)) as executor:
-        futures = [executor.submit(check_if_needed_update, issue) for issue in issues]
-        for future in concurrent.futures.as_completed(futures):
-            issue = future.result()
-            if issue:
-                to_update.append(issue)
-                updated.append(issue.get('key'))
-    
-    # Second pass: process all updates at once
+    to_update = []
+    for page in metrics.timed_iter(pages, metrics.SYNC_STAGE_SECONDS, 'fetch'):
+        total += len(page)
+        with metrics.timed(metrics.SYNC_STAGE_SECONDS, 'diff'):
+            to_update.extend(diff_issues(page))
+        while len(to_update) >= chunk_size:
+            updated.extend(store_chunk(to_update[:chunk_size]))
+            to_update = to_update[chunk_size:]
     if to_update:
-        logger.info(f"Processing {len(to_update)} issues")
-        insert_or_replace_batch(to_update)
+        updated.extend(store_chunk(to_update))
+
+    # Only move the watermark once everything fetched has been stored
+    set_watermark(jira_query, sync_started)
+    if updated:
+        leader.publish()
+    metrics.SYNC_STAGE_SECONDS.labels('total').observe(time.time() - sync_started)
+    metrics.SYNC_ISSUES.labels('fetched').inc(total)
+    metrics.SYNC_ISSUES.labels('changed').inc(len(updated))
     
     # Return the results
     return {
         'updated': updated,
-        'total': len(issues)
+        'total': total
     }
 
-def query_data(key,q,n_results):
+def store_chunk(issues):
+    """Embed and store a chunk of changed issues, returns their keys."""
+    logger.info(f"Processing {len(issues)} issues")
+    insert_or_replace_batch(issues)
+    return [issue.get('key') for issue in issues]
+
+def query_data(key,q,n_results,fields=None,max_text_length=None,mode='vector'):
     """
     Query the Jira database for issues based on a key or a query string.
 
@@ -68,14 +116,28 @@ def query_data(key,q,n_results):
         key (str, optional): The unique key of a Jira issue.
         q (str, optional): The query string to search for in the Jira database.
         n_results (int): The number of results to return.
+        fields (list | str, optional): Fields to return per issue, see QUERY_FIELDS.
+        max_text_length (int, optional): Shorten long text fields to this many characters.
+        mode (str): One of QUERY_MODES, 'lexical' and 'hybrid' need `q`.
 
     Returns:
         list: A list of dictionaries containing the query results.
+
+    Raises:
+        ValueError: If fields has unknown names or mode can't be used.
     """
-    ret = []
+    fields = parse_fields(fields, QUERY_FIELDS)
+    if mode not in QUERY_MODES:
+        raise ValueError(f"Unknown mode '{mode}', expected one of: {', '.join(QUERY_MODES)}")
+    if mode != 'vector':
+        if key or not q:
+            raise ValueError(f"Mode '{mode}' needs the query parameter 'q'")
+        if not lexical.ENABLED:
+            raise ValueError("The lexical index is disabled")
+        return text_query(format_value(q), n_results, fields, max_text_length, mode)
     if key:
         # Check if issue already exists
-        existed_issue = get_one_by_key(key)
+        existed_issue = get_one_by_key(key, include=["embeddings"])
         if not existed_issue:
             logger.info("Issue doesn't exist")
             # If not, fetch it and add to database
@@ -84,77 +146,318 @@ def query_data(key,q,n_results):
             except Exception as e:
                 logger.error(f"Failed to fetch issue {key}: {e}")
                 return []
-            insert_or_replace_one(issue)
-            # document([issue]) returns a list with one string, get that string for Bedrock
-            query_text = document([issue])[0] 
-            query_embedding = get_embedding_bedrock(query_text)
+            # Followers don't write, the leader stores the issue on its next sync
+            if leader.is_leader() and insert_or_replace_one(issue):
+                leader.publish()
+            # document([issue]) returns a list with one string, get that string to embed.
+            # It matches the stored document, so the embedding comes from the cache
+            query_text = document([issue], include_comments=not chunking_enabled())[0]
+            query_embedding = embed_text(query_text)
         else:
             query_embedding = existed_issue['embedding']
     else:
         # Use the provided query text
         query_text = format_value(q)
-        query_embedding = get_embedding_bedrock(query_text)
+        query_embedding = get_query_embedding(query_text)
 
     # Use ChromaDB's built-in query functionality
-    results = query(query_embedding, n_results)
-    
-    # Process results
-    for i in range(len(results['ids'][0])):
-        result_key = results['ids'][0][i]
+    results = query(query_embedding, n_results, include=query_include(fields))
+    return format_query_results(results, 0, n_results, fields, max_text_length)
+
+def text_query(q, n_results, fields, max_text_length, mode):
+    """Answer a query text from the lexical index, fused with the vector ranking in hybrid mode."""
+    distances = {}
+    if mode == 'lexical':
+        keys = [key for key, _ in lexical.search(q, n_results)]
+    else:
+        n_candidates = n_results * HYBRID_CANDIDATES_FACTOR
+        lexical_keys = [key for key, _ in lexical.search(q, n_candidates)]
+        results = query(get_query_embedding(q), n_candidates, include=["distances"])
+        vector_keys = results['ids'][0]
+        distances = dict(zip(vector_keys, results['distances'][0]))
+        keys = reciprocal_rank_fusion([vector_keys, lexical_keys])[:n_results]
+
+    metadatas = get_metadatas_by_keys(keys) if "metadatas" in query_include(fields) else {}
+    return [format_issue(key, metadatas.get(key, {}), fields, max_text_length, distances.get(key)) for key in keys]
+
+def reciprocal_rank_fusion(rankings):
+    """Merge rankings of keys, each key scores the sum of 1 / (RRF_K + rank) over the rankings."""
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank)
+    return sorted(scores, key=lambda key: -scores[key])
+
+def query_batch(items, n_results, fields=None, max_text_length=None):
+    """
+    Find similar issues for many keys and query texts at once.
+
+    Stored embeddings are loaded in one bulk lookup, query texts are embedded
+    concurrently, and all embeddings are searched with a single Chroma query.
+
+    Args:
+        items (list): Dictionaries with either a 'key' or a 'q' entry.
+        n_results (int): The number of results per item.
+        fields (list | str, optional): Fields to return per issue, see QUERY_FIELDS.
+        max_text_length (int, optional): Shorten long text fields to this many characters.
+
+    Returns:
+        list: One dictionary per input item, in input order, holding the item's
+            'key' or 'q' and its 'results'.
+
+    Raises:
+        ValueError: If an item has neither a key nor a query text, one of them
+            isn't a string, or fields has unknown names.
+    """
+    fields = parse_fields(fields, QUERY_FIELDS)
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Each item needs a 'key' or a 'q'")
+        for name in ('key', 'q'):
+            if item.get(name) is not None and not isinstance(item[name], str):
+                raise ValueError(f"'{name}' must be a string")
+        if not ((item.get('key') or '').strip() or (item.get('q') or '').strip()):
+            raise ValueError("Each item needs a non-empty 'key' or 'q'")
+
+    keys = [item['key'] for item in items if item.get('key')]
+    texts = [format_value(item['q']) for item in items if not item.get('key')]
+
+    embeddings_by_key = get_embeddings_by_keys(keys)
+    missing_keys = [key for key in dict.fromkeys(keys) if key not in embeddings_by_key]
+    if missing_keys:
+        embeddings_by_key.update(fetch_and_embed(missing_keys))
+    embeddings_by_text = dict(zip(texts, get_query_embeddings(texts)))
+
+    ret = []
+    to_query = []
+    for item in items:
+        if item.get('key'):
+            entry = {'key': item['key'], 'results': []}
+            vector = embeddings_by_key.get(item['key'])
+        else:
+            entry = {'q': item['q'], 'results': []}
+            vector = embeddings_by_text[format_value(item['q'])]
+        ret.append(entry)
+        if vector is not None:
+            to_query.append((entry, vector))
+
+    if to_query:
+        results = query_many([vector for _, vector in to_query], n_results, include=query_include(fields))
+        for i, (entry, _) in enumerate(to_query):
+            entry['results'] = format_query_results(results, i, n_results, fields, max_text_length)
+    return ret
+
+def fetch_and_embed(keys):
+    """Fetch issues that are not stored yet from Jira, store them and return their embeddings by key."""
+    issues = fetch_by_ids(keys)
+    if not issues:
+        return {}
+    # Followers don't write, the leader stores the issues on its next sync
+    if leader.is_leader() and insert_or_replace_batch(issues):
+        leader.publish()
+    # Read back what storing embedded, only issues that weren't stored are embedded here
+    ret = get_embeddings_by_keys([issue['key'] for issue in issues])
+    unstored = [issue for issue in issues if ret.get(issue['key']) is None]
+    if unstored:
+        texts = document(unstored, include_comments=not chunking_enabled())
+        ret.update(zip([issue['key'] for issue in unstored], embed_texts(texts)))
+    return ret
+
+def format_query_results(results, index, n_results, fields=ISSUE_FIELDS, max_text_length=None):
+    """Format the hits of the `index`-th query embedding of a Chroma query result."""
+    ret = []
+    ids = results['ids'][index]
+    metadatas = results['metadatas'][index] if results.get('metadatas') else None
+    distances = results['distances'][index] if results.get('distances') else None
+    for i in range(len(ids)):
         # Get metadata for this result
-        metadata = results['metadatas'][0][i] if 'metadatas' in results and results['metadatas'] else {}
+        metadata = metadatas[i] if metadatas else {}
+        distance = distances[i] if distances else None
         
         # Add to results
-        ret.append({
-            'key': result_key,
-            'summary': metadata.get('summary', 'No summary available'),
-            'url': metadata.get('url', 'No URL available'),
-            'assignee': metadata.get('assignee','None'),
-            'issuetype': metadata.get('issuetype','None'),
-            'description': metadata.get('description','None'),
-            'comment':metadata.get('comment'),
-            'status': metadata.get('status'),
-            'created': format_time_to_txt(metadata.get('created', 'No created date available'))
-        })
+        ret.append(format_issue(ids[i], metadata, fields, max_text_length, distance))
       
         # If we have enough results after filtering, break
         if len(ret) >= n_results:
             break  
     return ret
+
+def format_issue(key, metadata, fields=ISSUE_FIELDS, max_text_length=None, distance=None):
+    """Build the response of one issue with only the requested fields."""
+    issue = {
+        'key': key,
+        'summary': metadata.get('summary', 'No summary available'),
+        'url': metadata.get('url', 'No URL available'),
+        'assignee': metadata.get('assignee','None'),
+        'issuetype': metadata.get('issuetype','None'),
+        'description': metadata.get('description','None'),
+        'comment':metadata.get('comment'),
+        'status': metadata.get('status'),
+        'created': format_time_to_txt(metadata.get('created', 'No created date available')),
+        'distance': distance
+    }
+    ret = {field: issue[field] for field in fields}
+    if max_text_length:
+        for field in LONG_TEXT_FIELDS:
+            if isinstance(ret.get(field), str) and len(ret[field]) > max_text_length:
+                ret[field] = ret[field][:max_text_length] + '...'
+    return ret
+
+def parse_fields(fields, allowed=ISSUE_FIELDS):
+    """
+    Parse a fields selection, either a list or a comma-separated string.
+
+    Returns:
+        tuple: The requested field names, ISSUE_FIELDS if none were given.
+
+    Raises:
+        ValueError: If a field is not in `allowed`.
+    """
+    if not fields:
+        return ISSUE_FIELDS
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    fields = tuple(dict.fromkeys(str(field).strip() for field in fields if str(field).strip()))
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields or ISSUE_FIELDS
+
+def query_include(fields):
+    """The Chroma include list a query needs for the requested fields, documents are never needed."""
+    include = []
+    if any(field not in ('key', 'distance') for field in fields):
+        include.append("metadatas")
+    if 'distance' in fields:
+        include.append("distances")
+    return include
     
 def suggest_data(key):
+    """
+    Suggest a solution for an issue.
+
+    Suggestions are stored with the issue and reused until the issue document
+    or the suggestion model changes.
+    """
     ret={}
-    existed_issue = get_one_by_key(key)
+    existed_issue = get_one_by_key(key, include=["metadatas", "documents"])
     if not existed_issue:
         return []
-    ret['summary']=existed_issue['metadata']['summary']
-    ret['suggestion']=get_suggestion_bedrock(existed_issue['document'])
+    metadata = existed_issue['metadata']
+    ret['summary']=metadata['summary']
+    issue_document = suggestion_document(existed_issue)
+
+    cache_key = suggestion_cache_key(issue_document)
+    if metadata.get('suggestion_key') == cache_key and metadata.get('suggestion'):
+        logger.info(f"Using stored suggestion for {key}")
+        ret['suggestion']=metadata['suggestion']
+        return ret
+
+    ret['suggestion']=get_suggestion_bedrock(issue_document)
+    if leader.is_leader():
+        update_metadata(key, {'suggestion': ret['suggestion'], 'suggestion_key': cache_key})
     return ret
 
 
-def get_issues(assignee, created_after=None, n_results=200):
+def suggestion_document(existed_issue):
+    """The issue text given to the suggestion model, comments included."""
+    if existed_issue['metadata'].get('chunked'):
+        # The stored document leaves the comments to the chunks, they are still in the metadata
+        return document([existed_issue['metadata']])[0]
+    return existed_issue['document']
+
+
+def stream_suggest_data(key):
+    """
+    Suggest a solution for an issue while it is being generated.
+
+    Returns:
+        generator | None: Yields (event, data) tuples: one 'summary' event,
+            'suggestion' events carrying pieces of text, then 'done'.
+            None if the issue doesn't exist.
+    """
+    existed_issue = get_one_by_key(key, include=["metadatas", "documents"])
+    if not existed_issue:
+        return None
+    metadata = existed_issue['metadata']
+    issue_document = suggestion_document(existed_issue)
+    cache_key = suggestion_cache_key(issue_document)
+
+    def generate():
+        yield 'summary', {'summary': metadata['summary']}
+        if metadata.get('suggestion_key') == cache_key and metadata.get('suggestion'):
+            logger.info(f"Using stored suggestion for {key}")
+            yield 'suggestion', {'text': metadata['suggestion']}
+        else:
+            stream = stream_suggestion_bedrock(issue_document)
+            while True:
+                try:
+                    piece = next(stream)
+                except StopIteration as stop:
+                    # The generator returns the suggestion formatted as a whole, like /suggest gets it
+                    suggestion = stop.value
+                    break
+                yield 'suggestion', {'text': piece}
+            # Only a fully generated suggestion is stored, and only by the leader
+            if leader.is_leader():
+                update_metadata(key, {'suggestion': suggestion, 'suggestion_key': cache_key})
+        yield 'done', {}
+
+    return generate()
+
+
+def get_issues(assignee, created_after=None, n_results=200, cursor=None, order='desc', fields=None, max_text_length=None):
+    """
+    Get a page of the issues assigned to someone, sorted by created time.
+
+    Args:
+        assignee (str): The assignee to filter by.
+        created_after (str, optional): Only issues created at or after this time.
+        n_results (int): Page size.
+        cursor (str, optional): The next_cursor returned with the previous page.
+        order (str): 'desc' for newest first, 'asc' for oldest first.
+        fields (list | str, optional): Fields to return per issue, see ISSUE_FIELDS.
+        max_text_length (int, optional): Shorten long text fields to this many characters.
+
+    Returns:
+        (list, str | None): The issues of the page, and the cursor of the next
+            page, None on the last page.
+
+    Raises:
+        ValueError: If order, cursor, fields or n_results is invalid.
+    """
+    fields = parse_fields(fields)
+    if n_results < 1:
+        raise ValueError("n_results must be at least 1")
+    if order not in ('asc', 'desc'):
+        raise ValueError("order must be 'asc' or 'desc'")
+    after = decode_cursor(cursor, order) if cursor else None
+
     ret=[]
-    created_after_iso = format_time_to_iso(created_after)
-    metadata_filters = {
-        "$and": [
-            {"assignee": {"$eq": assignee}},
-            {"created": {"$gte": created_after_iso}}
-        ]
-    }
-    results = get(**metadata_filters)
-    for doc in results['metadatas']:
-        ret.append({
-            'key': doc['key'],
-            'summary': doc.get('summary', 'No summary available'),
-            'url': doc.get('url', 'No URL available'),
-            'assignee': doc.get('assignee','None'),
-            'comment':doc.get('comment'),
-            'issuetype': doc.get('issuetype','None'),
-            'description': doc.get('description','None'),
-            'status': doc.get('status'),
-            'created': format_time_to_txt(doc.get('created', 'No created date available'))
-        })
-    return ret
+    created_after_iso = format_time_to_iso(created_after) if created_after else None
+    metadatas, next_after = get_page(
+        [{"assignee": {"$eq": assignee}}],
+        n_results,
+        descending=order == 'desc',
+        after=after,
+        created_from=created_after_iso
+    )
+    for doc in metadatas:
+        ret.append(format_issue(doc['key'], doc, fields, max_text_length))
+    return ret, encode_cursor(next_after, order) if next_after else None
+
+def encode_cursor(after, order):
+    created, key = after
+    return base64.urlsafe_b64encode(json.dumps([created, key, order]).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, order):
+    try:
+        created, key, cursor_order = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if cursor_order != order:
+        raise ValueError("Cursor was created for a different order")
+    return created, key
 
 
 def _sync_scheduler_loop():
@@ -162,16 +465,27 @@ def _sync_scheduler_loop():
     global _keep_sync_running
     logger.info("Sync scheduler thread started.")
     while _keep_sync_running:
-        try:
-            logger.info(f"Scheduler: Calling sync_data at {datetime.now()}")
-            sync_data()
-            logger.info(f"Scheduler: sync_data finished. Next sync in {SYNC_INTERVAL_SECONDS} seconds.")
-        except Exception as e:
-            logger.error(f"Error during scheduled sync_data: {e}", exc_info=True)
-        
+        if leader.elect():
+            wait_seconds = SYNC_INTERVAL_SECONDS
+            try:
+                # A process that just took over may not have seen the last writes of the old leader
+                leader.follow()
+                logger.info(f"Scheduler: Calling sync_data at {datetime.now()}")
+                sync_data()
+                logger.info(f"Scheduler: sync_data finished. Next sync in {SYNC_INTERVAL_SECONDS} seconds.")
+            except Exception as e:
+                logger.error(f"Error during scheduled sync_data: {e}", exc_info=True)
+        else:
+            # Followers don't sync, they pick up what the leader wrote and retry the election
+            wait_seconds = leader.POLL_SECONDS
+            try:
+                leader.follow()
+            except Exception as e:
+                logger.error(f"Error while reopening the store: {e}", exc_info=True)
+
         # Wait for the interval, but check _keep_sync_running periodically
         # to allow for faster shutdown if needed.
-        for _ in range(SYNC_INTERVAL_SECONDS):
+        for _ in range(wait_seconds):
             if not _keep_sync_running:
                 break
             time.sleep(1)
@@ -201,52 +515,74 @@ def stop_background_sync():
         logger.info("Background sync thread was not running or already stopped.")
 
 
-def check_if_needed_update(issue):
+def diff_issues(issues):
+    """
+    Find the fetched issues that are new or changed since they were stored.
+
+    Existing metadata is loaded in bulk and compared against the stored
+    fingerprint of each issue.
+
+    Returns:
+        list: The issues that need to be inserted or updated.
+    """
+    # Keep the last copy if paging returned an issue twice, upsert rejects duplicate ids
+    issues = list({issue['key']: issue for issue in issues}.values())
+    existing = get_metadatas_by_keys([issue['key'] for issue in issues])
+    return [issue for issue in issues if needs_update(issue, existing.get(issue['key']))]
+
+
+def needs_update(issue, metadata):
+
+    if metadata is None:
+        # Issue doesn't exist, add to batch
+        logger.info(f"Issue {issue['key']} doesn't exist")
+        return True
+
+    if bool(metadata.get('chunked')) != chunking_enabled():
+        # The document has to be rewritten with or without its comments
+        logger.info(f"Issue {issue['key']} chunking changed")
+        return True
+
+    if metadata.get('fingerprint'):
+        if metadata['fingerprint'] != fingerprint(issue):
+            logger.info(f"Issue {issue['key']} changed")
+            return True
+        return False
 
+    # Records written before fingerprints existed are compared field by field
     need_update = False
-    # Get existing issue from database
-    existed_issue = get_one_by_key(issue['key'])
+
+    # Direct comparisons - the format should be consistent now
+    if metadata.get('status') != issue.get('status'):
+        logger.info(f"Status changed for {issue['key']}: {metadata.get('status')} -> {issue.get('status')}")
+        need_update = True
     
-    if existed_issue:
-        metadata = existed_issue['metadata']
-        
-        # Direct comparisons - the format should be consistent now
-        if metadata.get('status') != issue.get('status'):
-            logger.info(f"Status changed for {issue['key']}: {metadata.get('status')} -> {issue.get('status')}")
-            need_update = True
-        
-        # Check if summary or description changed
-        if metadata.get('summary') != issue.get('summary'):
-            logger.info(f"Summary changed for {issue['key']}")
-            need_update = True
-            
-        # Special handling for description - normalize empty values        
-        if format_value(metadata.get('description')) != format_value(issue.get('description')):
-            logger.info(f"Description changed for {issue['key']}")
-            need_update = True
-
-        # Check if created date changed
-        if isinstance(metadata.get('created'),str):
-            logger.info(f"Created date changed for {issue['key']}")
-            need_update = True
-        elif metadata.get('created') != format_time_to_iso(issue.get('created')):
-            logger.info(f"Created date changed for {issue['key']}")
-            need_update = True
-        
-        # Check if assignee changed
-        if metadata.get('assignee') != issue.get('assignee'):
-            logger.info(f"Assignee changed for {issue['key']}: {metadata.get('assignee')} -> {issue.get('assignee')}")
-            need_update = True
+    # Check if summary or description changed
+    if metadata.get('summary') != issue.get('summary'):
+        logger.info(f"Summary changed for {issue['key']}")
+        need_update = True
         
-        # Check if comments added or deleted
-        if metadata.get('comment_num') != issue.get('comment_num'):
-            logger.info(f"The number of comments changed for {issue['key']}")
-            need_update = True
-
-        if need_update:
-            # Add to batch for update
-            return issue
-    else:
-        # Issue doesn't exist, add to batch
-        logger.info(f"Issue {issue['key']} doesn't exist")
-        return issue
+    # Special handling for description - normalize empty values        
+    if format_value(metadata.get('description')) != format_value(issue.get('description')):
+        logger.info(f"Description changed for {issue['key']}")
+        need_update = True
+
+    # Check if created date changed
+    if isinstance(metadata.get('created'),str):
+        logger.info(f"Created date changed for {issue['key']}")
+        need_update = True
+    elif metadata.get('created') != format_time_to_iso(issue.get('created')):
+        logger.info(f"Created date changed for {issue['key']}")
+        need_update = True
+    
+    # Check if assignee changed
+    if metadata.get('assignee') != issue.get('assignee'):
+        logger.info(f"Assignee changed for {issue['key']}: {metadata.get('assignee')} -> {issue.get('assignee')}")
+        need_update = True
+    
+    # Check if comments added or deleted
+    if metadata.get('comment_num') != issue.get('comment_num'):
+        logger.info(f"The number of comments changed for {issue['key']}")
+        need_update = True
+
+    return need_update
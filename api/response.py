@@ -0,0 +1,120 @@
+import gzip
+import os
+import orjson
+from flask.json.provider import DefaultJSONProvider
+from util.logger import get_logger
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = get_logger(__name__)
+
+# Serialize JSON responses with orjson instead of the standard library encoder
+FAST_JSON = False
+# Compress responses when the client accepts gzip or br
+COMPRESSION = False
+COMPRESSION_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Server-sent events are flushed per event, compressing them would buffer the stream
+UNCOMPRESSIBLE_TYPES = ('text/event-stream',)
+
+
+def init():
+    global FAST_JSON, COMPRESSION, COMPRESSION_MIN_BYTES, GZIP_LEVEL, BROTLI_QUALITY
+    FAST_JSON = os.getenv('RESPONSE_FAST_JSON', 'false').lower() == 'true'
+    COMPRESSION = os.getenv('RESPONSE_COMPRESSION', 'false').lower() == 'true'
+    COMPRESSION_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESSION_MIN_BYTES', 1024))
+    GZIP_LEVEL = int(os.getenv('RESPONSE_GZIP_LEVEL', 6))
+    BROTLI_QUALITY = int(os.getenv('RESPONSE_BROTLI_QUALITY', 5))
+    if COMPRESSION and brotli is None:
+        logger.info("Brotli is not installed, responses are only compressed with gzip")
+    logger.info(f"Responses: fast JSON {FAST_JSON}, compression {COMPRESSION}")
+
+
+def dumps(obj, default=None):
+    """Serialize to JSON bytes with orjson, keys sorted like Flask's jsonify."""
+    return orjson.dumps(obj, default=default, option=orjson.OPT_SORT_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider that encodes with orjson, so jsonify needs no changes in the routes."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, default=self.default).decode('utf-8')
+
+
+def choose_encoding(accept_encoding):
+    """
+    Pick the response encoding from an Accept-Encoding header.
+
+    Returns:
+        str | None: 'br', 'gzip' or None if the client accepts neither.
+    """
+    if not COMPRESSION or not accept_encoding:
+        return None
+    accepted = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    wildcard = accepted.get('*', 0)
+    if brotli is not None and accepted.get('br', wildcard) > 0:
+        return 'br'
+    if accepted.get('gzip', wildcard) > 0:
+        return 'gzip'
+    return None
+
+
+def is_compressible(content_type, content_encoding=None):
+    if content_encoding or not content_type:
+        return False
+    content_type = content_type.split(';')[0].strip().lower()
+    if content_type in UNCOMPRESSIBLE_TYPES:
+        return False
+    return content_type.startswith('text/') or content_type.endswith('json')
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response, accept_encoding):
+    """Compress a buffered Flask response in place if the client and the payload allow it."""
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if not is_compressible(response.mimetype, response.headers.get('Content-Encoding')):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESSION_MIN_BYTES:
+        return response
+    response.set_data(compress(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def register(app):
+    """Install the configured JSON encoder and compression on a Flask app."""
+    if FAST_JSON:
+        app.json = OrjsonProvider(app)
+    if COMPRESSION:
+        from flask import request
+
+        @app.after_request
+        def compress_after_request(response):
+            return compress_response(response, request.headers.get('Accept-Encoding'))
@@ -0,0 +1,72 @@
+"""
+Synthetic issue corpora shaped like asset/jira.csv.
+
+Each synthetic issue starts from a real row of the CSV, so text lengths and
+the mix of Chinese and English match ours, and gets its own key, creation time,
+comments and a few unique words so no two documents are the same.
+"""
+import csv
+import os
+import random
+from datetime import datetime, timedelta, timezone
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'asset', 'jira.csv')
+
+PROJECTS = ('WINQFD00', 'MACQFD00', 'LNXQFD00', 'QTSAPP00', 'MYQNAP00')
+STATUSES = ('Open', 'In Progress', 'Resolved', 'close')
+ISSUE_TYPES = ('Bug', 'Task', 'Story', 'PM Task', 'Improvement')
+ASSIGNEES = tuple(f'user{i:02d}@example.com' for i in range(40)) + ('',)
+WORDS = ('login', 'timeout', 'crash', 'firmware', 'upgrade', 'NullPointerException', 'qfinder', 'smarturl',
+         '登入', '連線失敗', '韌體', '更新', '錯誤', '頁面', '權限', '備份')
+
+
+def load_samples(path=SAMPLE_CSV):
+    """Rows of the sample CSV, or made-up ones if it is not there."""
+    csv.field_size_limit(10 * 1024 * 1024)
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = [row for row in csv.DictReader(f) if row.get('summary')]
+    except FileNotFoundError:
+        rows = []
+    if rows:
+        return rows
+    rng = random.Random(0)
+    return [{
+        'summary': ' '.join(rng.choices(WORDS, k=rng.randint(4, 12))),
+        'description': ' '.join(rng.choices(WORDS, k=rng.randint(20, 400))),
+    } for _ in range(200)]
+
+
+def generate(n, seed=0, samples=None):
+    """
+    Generate `n` issues in the shape create_issue_structure reads from Jira.
+
+    Returns:
+        list: Issue dicts with key, summary, description, status, issuetype,
+            assignee, created and comments as (author, body) pairs.
+    """
+    rng = random.Random(seed)
+    samples = samples or load_samples()
+    start = datetime(2023, 1, 1, tzinfo=timezone(timedelta(hours=8)))
+    span = 3 * 365 * 24 * 3600
+    issues = []
+    for i in range(n):
+        sample = rng.choice(samples)
+        project = PROJECTS[i % len(PROJECTS)]
+        created = start + timedelta(seconds=rng.randrange(span))
+        marker = ' '.join(rng.choices(WORDS, k=3)) + f' build{rng.randrange(10 ** 6)}'
+        comments = [
+            (rng.choice(ASSIGNEES[:-1]), ' '.join(rng.choices(WORDS, k=rng.randint(3, 40))))
+            for _ in range(rng.choice((0, 0, 1, 2, 3, 5)))
+        ]
+        issues.append({
+            'key': f'{project}-{i // len(PROJECTS) + 1}',
+            'summary': f"{sample['summary']} {marker}",
+            'description': f"{sample.get('description', '')}\n{marker}",
+            'status': rng.choice(STATUSES),
+            'issuetype': rng.choice(ISSUE_TYPES),
+            'assignee': rng.choice(ASSIGNEES),
+            'created': created.strftime('%Y-%m-%dT%H:%M:%S.000%z'),
+            'comments': comments,
+        })
+    return issues
@@ -0,0 +1,224 @@
+"""
+Offline benchmark of sync and query against stub Jira, Bedrock and OAuth servers.
+
+    python -m bench.run --sizes 1000,10000 --bedrock-latency-ms 30 --throttle-rate 0.02
+
+Every corpus size runs in its own worker process with an empty Chroma
+directory, so peak RSS is per size. Results are written as JSON to
+bench/results/, and --baseline prints the change against an earlier run.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench import corpus
+from bench.stubs import JiraStub, BedrockStub, AuthStub
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+EMBEDDING_MODEL_ID = 'amazon.titan-embed-text-v2:0'
+TOKEN = 'bench-token'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync and query against local stub services")
+    parser.add_argument('--sizes', default='1000,10000', help="Comma-separated corpus sizes")
+    parser.add_argument('--queries', type=int, default=200, help="Queries per mode")
+    parser.add_argument('--n-results', type=int, default=5)
+    parser.add_argument('--dimensions', type=int, default=1024, help="Embedding size returned by the Bedrock stub")
+    parser.add_argument('--bedrock-latency-ms', type=float, default=20)
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help="Share of Bedrock calls answered with 429")
+    parser.add_argument('--jira-latency-ms', type=float, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Result file, defaults to bench/results/<timestamp>.json")
+    parser.add_argument('--baseline', help="Earlier result file to compare with")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # Settings come on stdin, the issue texts are too large for the command line
+        json.dump(run_worker(json.load(sys.stdin)), sys.stdout)
+        return
+
+    samples = corpus.load_samples()
+    results = []
+    for size in [int(size) for size in args.sizes.split(',')]:
+        print(f"Benchmarking {size} issues...", file=sys.stderr)
+        results.append(run_size(size, samples, args))
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'settings': {name: value for name, value in vars(args).items() if name not in ('worker', 'output', 'baseline')},
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = {result['size']: result for result in json.load(f)['results']}
+    print_report(results, baseline)
+    print(f"\nResults written to {output}")
+
+
+def run_size(size, samples, args):
+    """Start the stubs with a corpus of `size` issues and run one worker against them."""
+    issues = corpus.generate(size, seed=args.seed, samples=samples)
+    jira = JiraStub(issues, latency=args.jira_latency_ms / 1000).start()
+    bedrock = BedrockStub(args.dimensions, args.bedrock_latency_ms / 1000, args.throttle_rate, args.seed).start()
+    auth = AuthStub().start()
+    try:
+        with tempfile.TemporaryDirectory(prefix='bench-chroma-') as chroma_dir:
+            env = dict(
+                os.environ,
+                JIRA_URL=jira.url,
+                JIRA_API_TOKEN='bench',
+                JIRA_QUERY='project in (BENCH) ORDER BY created DESC',
+                FETCH_SIZE=str(size),
+                CHROMA_DIR=chroma_dir,
+                COLLECTION_NAME='bench_issues',
+                EMBEDDING_PROVIDER='bedrock',
+                BEDROCK_ENDPOINT_URL=bedrock.url,
+                BEDROCK_REGION='us-east-1',
+                BEDROCK_ACCESS_KEY_ID='bench',
+                BEDROCK_SECRET_ACCESS_KEY='bench',
+                BEDROCK_EMBEDDING_MODEL_ID=EMBEDDING_MODEL_ID,
+                AUTH_URL=auth.url,
+                APP_ID='bench',
+                # Measure the Bedrock path, not the embedding cache of an earlier run
+                EMBEDDING_CACHE_PATH=os.path.join(chroma_dir, 'embedding_cache.sqlite3'),
+                LOG_LEVEL='WARNING',
+            )
+            worker = {
+                'size': size,
+                'queries': args.queries,
+                'n_results': args.n_results,
+                'seed': args.seed,
+                'texts': [issue['summary'] for issue in issues],
+                'keys': [issue['key'] for issue in issues],
+            }
+            process = subprocess.run(
+                [sys.executable, '-m', 'bench.run', '--worker'],
+                input=json.dumps(worker).encode('utf-8'), env=env, stdout=subprocess.PIPE, check=True,
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            )
+            result = json.loads(process.stdout)
+    finally:
+        for server in (jira, bedrock, auth):
+            server.stop()
+    result['bedrock'] = {'requests': bedrock.requests, 'throttled': bedrock.throttled}
+    result['jira'] = {'requests': jira.requests}
+    return result
+
+
+def run_worker(settings):
+    """Runs in the worker process: sync everything, sync again, then time queries through the API."""
+    # Imported here so the parent process stays free of Chroma and boto3
+    from api import create_app
+    from api.jira_issue import service
+    from util.logger import setup_logging
+    import logging
+
+    app = create_app()
+    setup_logging(logging.WARNING)
+    size = settings['size']
+
+    start = time.perf_counter()
+    synced = service.sync_data(full=True)
+    sync_seconds = time.perf_counter() - start
+
+    # Nothing changed, so this only fetches and diffs
+    start = time.perf_counter()
+    service.sync_data(full=True)
+    resync_seconds = time.perf_counter() - start
+
+    rng = random.Random(settings['seed'])
+    n = min(settings['queries'], size)
+    texts = rng.sample(settings['texts'], n)
+    # A separate sample, so hybrid queries don't just hit the query embedding cache of the vector run
+    hybrid_texts = rng.sample(settings['texts'], n)
+    keys = rng.sample(settings['keys'], n)
+    client = app.test_client()
+    headers = {'Authorization': f'Bearer {TOKEN}'}
+    queries = {
+        'vector': [{'q': text} for text in texts],
+        'key': [{'key': key} for key in keys],
+        'lexical': [{'q': text, 'mode': 'lexical'} for text in texts],
+        'hybrid': [{'q': text, 'mode': 'hybrid'} for text in hybrid_texts],
+    }
+    latencies = {}
+    for mode, params in queries.items():
+        timings = []
+        for query in params:
+            start = time.perf_counter()
+            response = client.get('/query', query_string={**query, 'n_results': settings['n_results']}, headers=headers)
+            timings.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"/query {query} failed: {response.status_code} {response.get_data(as_text=True)}")
+        latencies[mode] = summarize(timings)
+
+    return {
+        'size': size,
+        'sync': {
+            'seconds': round(sync_seconds, 3),
+            'issues_per_second': round(len(synced.get('updated', [])) / sync_seconds, 1),
+        },
+        'resync': {
+            'seconds': round(resync_seconds, 3),
+            'issues_per_second': round(synced.get('total', size) / resync_seconds, 1),
+        },
+        'query_ms': latencies,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def summarize(timings):
+    timings = sorted(timings)
+
+    def percentile(p):
+        return round(timings[min(len(timings) - 1, int(round(p / 100 * (len(timings) - 1))))] * 1000, 2)
+
+    return {'p50': percentile(50), 'p95': percentile(95), 'p99': percentile(99)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def print_report(results, baseline=None):
+    def cell(value, old):
+        if old is None or not old:
+            return f"{value:>10}"
+        return f"{value:>10} ({(value - old) / old:+.0%})"
+
+    for result in results:
+        old = (baseline or {}).get(result['size'], {})
+        print(f"\n{result['size']} issues, peak RSS {cell(result['peak_rss_mb'], old.get('peak_rss_mb')).strip()} MB, "
+              f"Bedrock requests {result['bedrock']['requests']} (throttled {result['bedrock']['throttled']})")
+        print(f"  sync   {cell(result['sync']['issues_per_second'], old.get('sync', {}).get('issues_per_second'))} issues/s")
+        print(f"  resync {cell(result['resync']['issues_per_second'], old.get('resync', {}).get('issues_per_second'))} issues/s")
+        for mode, latency in result['query_ms'].items():
+            old_latency = old.get('query_ms', {}).get(mode, {})
+            print(f"  query {mode:<8}" + ''.join(
+                f" {p} {cell(latency[p], old_latency.get(p))} ms" for p in ('p50', 'p95', 'p99')))
+
+
+if __name__ == '__main__':
+    main()
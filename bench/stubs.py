@@ -0,0 +1,192 @@
+"""
+Local stand-ins for Jira, Bedrock and the OAuth server.
+
+They speak just enough of each API for the jira client, boto3 and util.token,
+so sync and query can be measured without production access.
+"""
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler):
+        super().__init__(('127.0.0.1', 0), handler)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class JsonHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real services, so connection pooling is measured too
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length', 0))
+        return json.loads(self.rfile.read(length) or b'{}')
+
+
+class JiraStub(StubServer):
+    """Jira REST API v2: serverInfo, field, search and issue, serving a fixed list of issues."""
+
+    FIELDS = [{'id': name, 'name': name.capitalize(), 'custom': False}
+              for name in ('summary', 'status', 'description', 'created', 'issuetype', 'assignee', 'comment')]
+
+    def __init__(self, issues, latency=0.0, max_page_size=100):
+        self.issues = [to_jira_issue(issue) for issue in issues]
+        self.by_key = {issue['key']: issue for issue in self.issues}
+        self.latency = latency
+        self.max_page_size = max_page_size
+        super().__init__(JiraHandler)
+
+
+class JiraHandler(JsonHandler):
+    def do_GET(self):
+        server = self.server
+        server.count()
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if server.latency:
+            time.sleep(server.latency)
+        if url.path.endswith('/serverInfo'):
+            return self.send_json(200, {'baseUrl': server.url, 'version': '9.12.0', 'versionNumbers': [9, 12, 0],
+                                        'deploymentType': 'Server', 'serverTitle': 'Jira stub'})
+        if url.path.endswith('/field'):
+            return self.send_json(200, server.FIELDS)
+        if url.path.endswith('/search'):
+            start_at = int(params.get('startAt', ['0'])[0])
+            max_results = min(int(params.get('maxResults', ['50'])[0]), server.max_page_size)
+            page = server.issues[start_at:start_at + max_results]
+            return self.send_json(200, {'startAt': start_at, 'maxResults': max_results,
+                                        'total': len(server.issues), 'issues': page})
+        match = re.search(r'/issue/([^/]+)$', url.path)
+        if match and unquote(match.group(1)) in server.by_key:
+            return self.send_json(200, server.by_key[unquote(match.group(1))])
+        self.send_json(404, {'errorMessages': ['Not found'], 'errors': {}})
+
+
+def to_jira_issue(issue):
+    """Turn a flat issue like the ones in asset/jira.csv into a Jira REST issue."""
+    comments = [{'id': f"{issue['key']}-{i}", 'author': {'name': author, 'displayName': author}, 'body': body}
+                for i, (author, body) in enumerate(issue.get('comments', []))]
+    return {
+        'id': issue['key'].split('-')[-1],
+        'key': issue['key'],
+        'fields': {
+            'summary': issue['summary'],
+            'status': {'name': issue['status']},
+            'description': issue['description'],
+            'created': issue['created'],
+            'issuetype': {'name': issue['issuetype']},
+            'assignee': {'name': issue['assignee'], 'displayName': issue['assignee']} if issue['assignee'] else None,
+            'comment': {'comments': comments, 'total': len(comments), 'maxResults': len(comments), 'startAt': 0},
+        },
+    }
+
+
+class BedrockStub(StubServer):
+    """
+    bedrock-runtime invoke_model for Titan embedding models.
+
+    Vectors are derived from a hash of the input text, so the same text always
+    gets the same vector. A share of the calls can be throttled with HTTP 429
+    like Bedrock does when over quota.
+    """
+
+    def __init__(self, dimensions=1024, latency=0.0, throttle_rate=0.0, seed=0):
+        self.dimensions = dimensions
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.throttled = 0
+        self._random = random.Random(seed)
+        super().__init__(BedrockHandler)
+
+    def should_throttle(self):
+        with self._lock:
+            throttle = self._random.random() < self.throttle_rate
+            if throttle:
+                self.throttled += 1
+            return throttle
+
+
+class BedrockHandler(JsonHandler):
+    def do_POST(self):
+        server = self.server
+        server.count()
+        body = self.read_json()
+        if not self.path.endswith('/invoke'):
+            return self.send_json(404, {'message': 'Unknown operation'})
+        if server.should_throttle():
+            return self.send_json(429, {'message': 'Too many requests, please wait before trying again.'},
+                                  {'x-amzn-ErrorType': 'ThrottlingException:http://internal.amazon.com/coral/com.amazon.bedrock/'})
+        if server.latency:
+            time.sleep(server.latency)
+        text = body.get('inputText', '')
+        embedding = deterministic_vector(text, body.get('dimensions') or server.dimensions)
+        self.send_json(200, {
+            'embedding': embedding,
+            'embeddingsByType': {'float': embedding},
+            'inputTextTokenCount': len(text.split()),
+        })
+
+
+def deterministic_vector(text, dimensions):
+    digest = hashlib.shake_256(text.encode('utf-8')).digest(dimensions)
+    return [(b - 127.5) / 127.5 for b in digest]
+
+
+class AuthStub(StubServer):
+    """OAuth tokeninfo endpoint that accepts every token."""
+
+    def __init__(self):
+        super().__init__(AuthHandler)
+
+
+class AuthHandler(JsonHandler):
+    def do_GET(self):
+        self.server.count()
+        if not urlparse(self.path).path.endswith('/oauth/tokeninfo'):
+            return self.send_json(404, {'error': 'not_found'})
+        self.send_json(200, {
+            'client_id': 'bench',
+            'scope': 'read',
+            'expires_in': 3600,
+            'user_id': 'bench-user',
+            'user': {'email': 'bench@example.com', 'display_name': 'Bench'},
+        })
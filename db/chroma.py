@@ -1,105 +1,485 @@
 import chromadb
 import os
-from util.txt_process import document, format_value
-from models.embedding import get_embedding_bedrock_batch
+import threading
+from chromadb.api import ServerAPI
+from chromadb.api.client import Client
+from chromadb.config import Settings, System
+from chromadb.telemetry.product import ProductTelemetryClient
+from db import leader, lexical
+from util.txt_process import document, format_value, fingerprint, text_hash
+from models import embedding
+from models.embedding import embed_texts
+from util import metrics
 from util.logger import get_logger
 from util.txt_process import format_time_to_iso
 import multiprocessing
+import time
 logger = get_logger(__name__)
 
+CHROMA_DIR = None
+COLLECTION_NAME = None
+# Chroma system behind CLIENT, kept to stop it once a reload replaced it
+SYSTEM = None
 CLIENT = None
 COLLECTION = None
 
+# Comment chunks, one record per comment (part), only used with ISSUE_CHUNKING
+CHUNKS = None
+CHUNKING = False
+# Longer comments are split, so no part is cut off by the embedding model's input limit
+CHUNK_MAX_CHARS = 4000
+# Chunk hits fetched per query, as a multiple of n_results, several chunks may belong to one issue
+CHUNK_CANDIDATES_FACTOR = 4
+
+# Metadata fields that belong to the stored document rather than to the Jira issue,
+# they survive metadata-only updates
+DOCUMENT_DERIVED_FIELDS = ('suggestion', 'suggestion_key')
+
+# Number of ids per COLLECTION.get call, keeps each SQLite query reasonably sized
+GET_BATCH_SIZE = 1000
+
+# Width in seconds of the first created-time window probed by get_page
+PAGE_WINDOW_START = 7 * 24 * 3600
+
+# Seconds a client replaced by reload stays open for the requests still using it
+RETIRED_CLIENT_SECONDS = 60
+# Seconds a follower waits at startup for the leader to create a missing collection
+COLLECTION_WAIT_SECONDS = 60
+
 def init():
-    global CLIENT
-    global COLLECTION
+    global CHROMA_DIR, COLLECTION_NAME, SYSTEM, CLIENT, COLLECTION
     # Load constants from environment variables
     CHROMA_DIR = os.getenv('CHROMA_DIR')
     COLLECTION_NAME = os.getenv('COLLECTION_NAME')
     logger.info(f"Available CPU count: {multiprocessing.cpu_count()}")
     logger.info(f"Chroma directory: {CHROMA_DIR}")
     
-    # Fix: Add proper HNSW configuration
-    collection_metadata = {
-        "hnsw:num_threads": 1   # Must be a positive integer
-    }
+    # HNSW settings only apply when the collection is created, use db.rebuild to change them
+    collection_metadata = hnsw_metadata()
+    # Record the embedding model, vectors of different models can't be searched together
+    model = embedding.model_id()
+    dimension = embedding.dimension()
+    if model:
+        collection_metadata["embedding_model"] = model
+    if dimension:
+        collection_metadata["embedding_dimension"] = dimension
 
-    CLIENT = chromadb.PersistentClient(path=CHROMA_DIR)
-    
-    # Try to get the collection, create if it doesn't exist
+    SYSTEM, CLIENT = open_client(CHROMA_DIR)
+    COLLECTION = open_collection(CLIENT, COLLECTION_NAME, collection_metadata)
+    check_embedding_model(COLLECTION_NAME, model, dimension)
+    check_hnsw_metadata(COLLECTION_NAME, collection_metadata)
+    metrics.register_gauge('issue_search_collection_records', 'Issues stored in the Chroma collection',
+                           lambda: COLLECTION.count())
+
+    global CHUNKS, CHUNKING, CHUNK_MAX_CHARS
+    CHUNKING = os.getenv('ISSUE_CHUNKING', 'false').lower() == 'true'
+    CHUNK_MAX_CHARS = int(os.getenv('CHUNK_MAX_CHARS', 4000))
+    if CHUNKING:
+        # Chunks are searched together with the issues, so they share the distance function
+        chunk_metadata = dict(collection_metadata, **{"hnsw:space": (COLLECTION.metadata or {}).get("hnsw:space", "l2")})
+        CHUNKS = open_collection(CLIENT, f"{COLLECTION_NAME}_chunks", chunk_metadata)
+        logger.info(f"Comment chunks are stored in {COLLECTION_NAME}_chunks")
+
+def open_client(path):
+    """
+    Open a persistent client on a Chroma system of its own.
+
+    chromadb.PersistentClient shares one system per path, so a second client
+    on the same path would keep serving the index loaded by the first.
+
+    Returns:
+        (System, ClientAPI): The started system and a client using it.
+    """
+    settings = Settings(is_persistent=True, persist_directory=path)
+    system = System(settings)
+    system.instance(ProductTelemetryClient)
+    system.instance(ServerAPI)
+    system.start()
+    return system, Client.from_system(system)
+
+def open_collection(client, name, metadata):
+    """Get a collection, only the sync leader creates it when it doesn't exist, followers wait for that."""
+    deadline = time.time() + COLLECTION_WAIT_SECONDS
+    while True:
+        try:
+            collection = client.get_collection(name=name)
+            logger.info(f"Collection {name} already exists")
+            return collection
+        except chromadb.errors.NotFoundError:
+            pass
+        if leader.is_leader():
+            logger.info(f"Collection {name} does not exist, creating it")
+            return client.create_collection(name=name, metadata=metadata)
+        if time.time() > deadline:
+            raise RuntimeError(f"Collection {name} doesn't exist and the sync leader hasn't created it")
+        logger.info(f"Waiting for the sync leader to create collection {name}")
+        time.sleep(1)
+
+def reload():
+    """
+    Reopen the store, so writes of another process become visible.
+
+    The new client and collections are opened next to the current ones and
+    then swapped in. The replaced system is stopped after
+    RETIRED_CLIENT_SECONDS, so requests still using it can finish.
+    """
+    global SYSTEM, CLIENT, COLLECTION, CHUNKS
+    system, client = open_client(CHROMA_DIR)
     try:
-        COLLECTION = CLIENT.get_collection(name=COLLECTION_NAME)
-        logger.info(f"Collection {COLLECTION_NAME} already exists")
-    except chromadb.errors.NotFoundError:
-        logger.info(f"Collection {COLLECTION_NAME} does not exist, creating it")
-        COLLECTION = CLIENT.create_collection(
-            name=COLLECTION_NAME,
-            metadata=collection_metadata
+        collection = client.get_collection(name=COLLECTION_NAME)
+        chunks = client.get_collection(name=f"{COLLECTION_NAME}_chunks") if CHUNKING else None
+    except Exception:
+        system.stop()
+        raise
+    retired = SYSTEM
+    SYSTEM, CLIENT, COLLECTION, CHUNKS = system, client, collection, chunks
+    if retired is not None:
+        timer = threading.Timer(RETIRED_CLIENT_SECONDS, retired.stop)
+        timer.daemon = True
+        timer.start()
+
+def chunking_enabled():
+    return CHUNKING
+
+def hnsw_metadata():
+    """HNSW index settings for new collections, from the HNSW_* environment variables."""
+    return {
+        "hnsw:space": os.getenv('HNSW_SPACE', 'l2'),
+        "hnsw:M": int(os.getenv('HNSW_M', 16)),
+        "hnsw:construction_ef": int(os.getenv('HNSW_CONSTRUCTION_EF', 100)),
+        "hnsw:search_ef": int(os.getenv('HNSW_SEARCH_EF', 10)),
+        # Threads used to insert into the index, must be a positive integer
+        "hnsw:num_threads": int(os.getenv('HNSW_NUM_THREADS', multiprocessing.cpu_count())),
+    }
+
+def check_hnsw_metadata(collection_name, configured):
+    """Warn when the existing collection was built with other HNSW settings."""
+    stored = COLLECTION.metadata or {}
+    differing = [f"{name}={stored.get(name)}" for name, value in configured.items()
+                 if name.startswith("hnsw:") and name in stored and stored[name] != value]
+    if differing:
+        logger.warning(f"Collection {collection_name} keeps its HNSW settings {', '.join(differing)}, run db.rebuild to apply new ones")
+
+def check_embedding_model(collection_name, model, dimension):
+    """Refuse to use a collection built with another embedding model or dimension."""
+    stored_model = (COLLECTION.metadata or {}).get("embedding_model")
+    if stored_model and model and stored_model != model:
+        raise RuntimeError(
+            f"Collection {collection_name} holds embeddings of {stored_model} but {model} is configured, "
+            f"use another COLLECTION_NAME or rebuild the collection"
         )
+    if not stored_model:
+        logger.warning(f"Collection {collection_name} has no recorded embedding model")
+    if dimension and COLLECTION.count():
+        stored = COLLECTION.peek(1)["embeddings"]
+        if stored is not None and len(stored) and len(stored[0]) != dimension:
+            raise RuntimeError(
+                f"Collection {collection_name} holds {len(stored[0])}-dimensional embeddings "
+                f"but the configured model produces {dimension}"
+            )
    
 
 
-def get_one_by_key(key):
+def get_one_by_key(key, include=None):
     # Query the COLLECTION for the exact key
-    results = COLLECTION.get(
-        ids=[key],
-        include=["metadatas", "documents", "embeddings"]
-    )
+    with metrics.timed(metrics.CHROMA_LATENCY, 'get'):
+        results = COLLECTION.get(
+            ids=[key],
+            include=include or ["metadatas", "documents", "embeddings"]
+        )
     
     # Check if we found any results
     if results and 'ids' in results and len(results['ids']) > 0:
+        documents = results.get('documents')
+        embeddings = results.get('embeddings')
+        metadatas = results.get('metadatas')
         # Create a structured response similar to MongoDB
         return {
             '_id': results['ids'][0],
-            'document': results['documents'][0] if 'documents' in results and len(results['documents']) > 0 else None,
-            'embedding': results['embeddings'][0] if 'embeddings' in results and len(results['embeddings']) > 0 else None,
-            'metadata': results['metadatas'][0] if 'metadatas' in results and len(results['metadatas']) > 0 else {}
+            'document': documents[0] if documents is not None and len(documents) > 0 else None,
+            'embedding': embeddings[0] if embeddings is not None and len(embeddings) > 0 else None,
+            'metadata': metadatas[0] if metadatas is not None and len(metadatas) > 0 else {}
         }
     return None
 
+def update_metadata(key, metadata):
+    """Set metadata fields of one issue, fields that are not given are kept."""
+    leader.check_writable()
+    COLLECTION.update(
+        ids=[key],
+        metadatas=[metadata]
+    )
+
+def get_metadatas_by_keys(keys):
+    """
+    Get the stored metadata of many issues with a few bulk lookups.
+
+    Returns:
+        dict: Issue key to metadata, keys that are not stored are left out.
+    """
+    keys = list(dict.fromkeys(keys))
+    ret = {}
+    for i in range(0, len(keys), GET_BATCH_SIZE):
+        results = COLLECTION.get(
+            ids=keys[i:i + GET_BATCH_SIZE],
+            include=["metadatas"]
+        )
+        for key, metadata in zip(results['ids'], results['metadatas']):
+            ret[key] = metadata or {}
+    return ret
+
+def get_embeddings_by_keys(keys):
+    """
+    Get the stored embeddings of many issues with a few bulk lookups.
+
+    Returns:
+        dict: Issue key to embedding as a list of floats, like the embedding
+            models return, keys that are not stored are left out.
+    """
+    keys = list(dict.fromkeys(keys))
+    ret = {}
+    for i in range(0, len(keys), GET_BATCH_SIZE):
+        results = COLLECTION.get(
+            ids=keys[i:i + GET_BATCH_SIZE],
+            include=["embeddings"]
+        )
+        # Chroma returns numpy arrays and rejects a query mixing them with lists
+        for key, vector in zip(results['ids'], results['embeddings']):
+            ret[key] = vector.tolist() if hasattr(vector, 'tolist') else list(vector)
+    return ret
+
 def get_all():
     return COLLECTION.get()
 
+def iter_metadatas(batch_size=GET_BATCH_SIZE):
+    """Yield the metadata of every stored issue, reading the collection in batches."""
+    offset = 0
+    while True:
+        results = COLLECTION.get(include=["metadatas"], limit=batch_size, offset=offset)
+        for metadata in results['metadatas']:
+            yield metadata or {}
+        if len(results['ids']) < batch_size:
+            break
+        offset += batch_size
+
 
 def insert_or_replace_one(issue):
    
     logger.info(f"Updating issue: {issue['key']}")
-    key = issue.get('key', '')
-    document, embedding, metadata = create_entry([issue])
-
-    # Use upsert to handle both insert and update cases in a single operation
-    COLLECTION.upsert(
-        ids=key,
-        documents=document,
-        embeddings=embedding,
-        metadatas=metadata
-    )
+    return insert_or_replace_batch([issue])
 
 
 def insert_or_replace_batch(issues):
-   
+    """
+    Insert or update issues.
+
+    Issues whose document text is unchanged only get their metadata updated,
+    the embedding is regenerated only when the document text changed.
+
+    Returns:
+        bool: Whether anything was written.
+    """
+    leader.check_writable()
+    # Keep the last copy of duplicated keys, upsert rejects duplicate ids
+    issues = list({issue['key']: issue for issue in issues if issue.get('key', '')}.values())
+    if not issues:
+        return False
+
     # Extract keys for IDs
-    ids = [issue.get('key', '') for issue in issues if issue.get('key', '')]
+    ids = [issue.get('key') for issue in issues]
+    doc_texts = document(issues, include_comments=not CHUNKING)
+    metadatas = create_metadatas(issues, doc_texts)
 
-    # Use the enhanced create_entry function to process all issues at once
-    documents, embeddings, metadatas = create_entry(issues)
-    
-    # Use upsert to handle both insert and update cases in a single operation
-    COLLECTION.upsert(
-        ids=ids,
-        documents=documents,
-        embeddings=embeddings,
-        metadatas=metadatas
-    )
-    
-def query(query_embedding, n_results=5):
+    with metrics.timed(metrics.SYNC_STAGE_SECONDS, 'lookup'):
+        existing = get_metadatas_by_keys(ids)
+    stored_hashes = get_doc_hashes(existing)
+    unchanged = [i for i, key in enumerate(ids) if stored_hashes.get(key) == metadatas[i]['doc_hash']]
+    changed = [i for i, key in enumerate(ids) if stored_hashes.get(key) != metadatas[i]['doc_hash']]
+    logger.info(f"Metadata-only updates: {len(unchanged)}, document updates: {len(changed)}")
+
+    for i in unchanged:
+        stored = existing[ids[i]]
+        metadatas[i].update({field: stored[field] for field in DOCUMENT_DERIVED_FIELDS if field in stored})
+    # Identical metadata isn't written again
+    unchanged = [i for i in unchanged if metadatas[i] != existing[ids[i]]]
+    if unchanged:
+        with metrics.timed(metrics.SYNC_STAGE_SECONDS, 'upsert'):
+            COLLECTION.update(
+                ids=[ids[i] for i in unchanged],
+                metadatas=[metadatas[i] for i in unchanged]
+            )
+        # Fields like the comment can change without the document, with ISSUE_CHUNKING
+        lexical.index_metadatas([metadatas[i] for i in unchanged
+                                 if any(metadatas[i].get(field) != existing[ids[i]].get(field) for field in lexical.INDEXED_FIELDS)])
+
+    if changed:
+        changed_texts = [doc_texts[i] for i in changed]
+        with metrics.timed(metrics.SYNC_STAGE_SECONDS, 'embed'):
+            embeddings = embed_texts(changed_texts)
+        # Use upsert to handle both insert and update cases in a single operation
+        with metrics.timed(metrics.SYNC_STAGE_SECONDS, 'upsert'):
+            COLLECTION.upsert(
+                ids=[ids[i] for i in changed],
+                documents=changed_texts,
+                embeddings=embeddings,
+                metadatas=[metadatas[i] for i in changed]
+            )
+        lexical.index_metadatas([metadatas[i] for i in changed])
+
+    chunks_written = store_comment_chunks(issues) if CHUNKING else False
+    return bool(unchanged or changed or chunks_written)
+
+
+def store_comment_chunks(issues):
+    """
+    Store the comments of issues as chunks of their own.
+
+    Each chunk has a stable id, so only new or edited comments are embedded,
+    and chunks of deleted comments are removed.
+
+    Returns:
+        bool: Whether any chunk was written or removed.
+    """
+    leader.check_writable()
+    # Issues that didn't come from Jira have no comment list, their chunks are left alone
+    issues = [issue for issue in issues if issue.get('comments') is not None]
+    if not issues:
+        return False
+    chunks = {}
+    for issue in issues:
+        for chunk_id, text, metadata in comment_chunks(issue):
+            chunks[chunk_id] = (text, metadata)
+
+    keys = [issue['key'] for issue in issues]
+    with metrics.timed(metrics.SYNC_STAGE_SECONDS, 'lookup'):
+        stored = CHUNKS.get(where={"key": {"$in": keys}}, include=["metadatas"])
+    stored_hashes = {chunk_id: (metadata or {}).get('doc_hash') for chunk_id, metadata in zip(stored['ids'], stored['metadatas'])}
+
+    changed = [chunk_id for chunk_id, (_, metadata) in chunks.items() if stored_hashes.get(chunk_id) != metadata['doc_hash']]
+    removed = [chunk_id for chunk_id in stored_hashes if chunk_id not in chunks]
+    logger.info(f"Comment chunks changed: {len(changed)}, unchanged: {len(chunks) - len(changed)}, removed: {len(removed)}")
+    if changed:
+        texts = [chunks[chunk_id][0] for chunk_id in changed]
+        with metrics.timed(metrics.SYNC_STAGE_SECONDS, 'embed'):
+            embeddings = embed_texts(texts)
+        with metrics.timed(metrics.SYNC_STAGE_SECONDS, 'upsert'):
+            CHUNKS.upsert(
+                ids=changed,
+                documents=texts,
+                embeddings=embeddings,
+                metadatas=[chunks[chunk_id][1] for chunk_id in changed]
+            )
+    if removed:
+        CHUNKS.delete(ids=removed)
+    return bool(changed or removed)
+
+
+def comment_chunks(issue):
+    """
+    Split the comments of an issue into chunks.
+
+    Returns:
+        list: (chunk id, text, metadata) tuples. The id is
+            '{key}::comment::{comment id}', with '::{n}' added for the n-th
+            extra part of a long comment.
+    """
+    ret = []
+    key = issue['key']
+    for comment in issue.get('comments') or []:
+        body = format_value(comment.get('body'))
+        if not body:
+            continue
+        parts = [body[i:i + CHUNK_MAX_CHARS] for i in range(0, len(body), CHUNK_MAX_CHARS)]
+        for n, part in enumerate(parts):
+            chunk_id = f"{key}::comment::{comment.get('id')}" + (f"::{n}" if n else '')
+            text = f"{comment.get('author')}: {part}"
+            ret.append((chunk_id, text, {'key': key, 'comment_id': str(comment.get('id')), 'doc_hash': text_hash(text)}))
+    return ret
+
+
+def get_doc_hashes(metadatas):
+    """
+    Get the hash of the stored document text of many issues.
+
+    Args:
+        metadatas (dict): Issue key to stored metadata, as returned by get_metadatas_by_keys.
+
+    Returns:
+        dict: Issue key to document hash.
+    """
+    ret = {}
+    legacy_keys = []
+    for key, metadata in metadatas.items():
+        if metadata.get('doc_hash'):
+            ret[key] = metadata['doc_hash']
+        else:
+            legacy_keys.append(key)
+
+    # Records written before doc_hash existed are hashed from the stored document
+    for i in range(0, len(legacy_keys), GET_BATCH_SIZE):
+        results = COLLECTION.get(
+            ids=legacy_keys[i:i + GET_BATCH_SIZE],
+            include=["documents"]
+        )
+        for key, doc in zip(results['ids'], results['documents']):
+            if doc is not None:
+                ret[key] = text_hash(doc)
+    return ret
+
+def query(query_embedding, n_results=5, include=None):
    
     # Use ChromaDB's built-in query functionality
-    results = COLLECTION.query(
-        query_embeddings=[query_embedding],
-        n_results=n_results
-    )
-    return results
+    return query_many([query_embedding], n_results, include)
+
+def query_many(query_embeddings, n_results=5, include=None):
+    """Search with many embeddings in one call, results are lists per embedding."""
+    include = include if include is not None else ["metadatas", "distances"]
+    if CHUNKING:
+        return query_with_chunks(query_embeddings, n_results, include)
+    with metrics.timed(metrics.CHROMA_LATENCY, 'query'):
+        return COLLECTION.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=include
+        )
+
+def query_with_chunks(query_embeddings, n_results, include):
+    """
+    Search issues and comment chunks, and rank issues by their closest hit.
+
+    Returns results shaped like COLLECTION.query, with one id per issue.
+    """
+    with metrics.timed(metrics.CHROMA_LATENCY, 'query'):
+        issue_hits = COLLECTION.query(query_embeddings=query_embeddings, n_results=n_results, include=["distances"])
+    with metrics.timed(metrics.CHROMA_LATENCY, 'query_chunks'):
+        chunk_hits = CHUNKS.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results * CHUNK_CANDIDATES_FACTOR,
+            include=["metadatas", "distances"]
+        )
+
+    ids = []
+    distances = []
+    for i in range(len(query_embeddings)):
+        best = {}
+        hits = list(zip(issue_hits['ids'][i], issue_hits['distances'][i]))
+        hits += [((metadata or {}).get('key'), distance) for metadata, distance in zip(chunk_hits['metadatas'][i], chunk_hits['distances'][i])]
+        for key, distance in hits:
+            if key and (key not in best or distance < best[key]):
+                best[key] = distance
+        keys = sorted(best, key=best.get)[:n_results]
+        ids.append(keys)
+        distances.append([best[key] for key in keys])
+
+    metadatas = None
+    if "metadatas" in include:
+        stored = get_metadatas_by_keys([key for keys in ids for key in keys])
+        metadatas = [[stored.get(key, {}) for key in keys] for keys in ids]
+    return {
+        'ids': ids,
+        'metadatas': metadatas,
+        'distances': distances if "distances" in include else None,
+    }
 
 def get(**metadata_filters):
     results = COLLECTION.get(
@@ -107,13 +487,119 @@ def get(**metadata_filters):
     )
     return results
 
+def get_page(conditions, limit, descending=True, after=None, created_from=None):
+    with metrics.timed(metrics.CHROMA_LATENCY, 'get_page'):
+        return _get_page(conditions, limit, descending, after, created_from)
+
+def _get_page(conditions, limit, descending=True, after=None, created_from=None):
+    """
+    Get a page of issues sorted by created time, then key.
+
+    Chroma can't sort, so the page is located by probing ever wider created-time
+    windows with id-only lookups, and only the windows that hold the page are
+    loaded with metadata.
+
+    Args:
+        conditions (list): Chroma where conditions every issue must match.
+        limit (int): Page size.
+        descending (bool): Newest first.
+        after (tuple, optional): (created, key) of the last issue of the previous page.
+        created_from (int, optional): Earliest created time, as a Unix timestamp.
+
+    Returns:
+        (list, tuple | None): The metadatas of the page, and the (created, key)
+            to pass as `after` for the next page, None on the last page.
+    """
+    need = limit + 1
+    page = []
+    lo = created_from or 0
+    hi = int(time.time()) + 24 * 3600
+
+    if after:
+        created, key = after
+        # Issues created at the same second as the cursor are ordered by key
+        ties = COLLECTION.get(
+            where=_and(conditions + [{"created": {"$eq": created}}]),
+            include=["metadatas"]
+        )['metadatas']
+        ties = [m for m in ties if (m['key'] < key if descending else m['key'] > key)]
+        page = sorted(ties, key=lambda m: m['key'], reverse=descending)[:need]
+        if descending:
+            hi = created
+        else:
+            lo = created
+
+    # Scan [lo, hi) window by window until the page is full
+    while len(page) < need and lo < hi:
+        window_lo, window_hi = _find_window(conditions, lo, hi, descending, need - len(page))
+        records = COLLECTION.get(
+            where=_and(conditions + _created_range(window_lo, window_hi)),
+            include=["metadatas"]
+        )['metadatas']
+        if after:
+            records = [m for m in records if m['created'] != after[0]]
+        records.sort(key=lambda m: (m['created'], m['key']), reverse=descending)
+        page.extend(records[:need - len(page)])
+        if descending:
+            hi = window_lo
+        else:
+            lo = window_hi
+
+    if len(page) > limit:
+        page = page[:limit]
+        return page, (page[-1]['created'], page[-1]['key'])
+    return page, None
+
+def _find_window(conditions, lo, hi, descending, want):
+    """
+    Find a created-time window at the newest (or oldest) end of [lo, hi) that
+    holds at least `want` issues, or all of [lo, hi) if it holds fewer.
+    """
+    def window(width):
+        if descending:
+            return max(lo, hi - width), hi
+        return lo, min(hi, lo + width)
+
+    def count(width):
+        return len(COLLECTION.get(where=_and(conditions + _created_range(*window(width))), include=[])['ids'])
+
+    narrow, width = 0, PAGE_WINDOW_START
+    found = count(width)
+    while found < want and width < hi - lo:
+        narrow, width = width, width * 2
+        found = count(width)
+
+    # Shrink a window that a burst of issues made much larger than needed
+    while found > 4 * want and width - narrow > 1:
+        middle = (narrow + width) // 2
+        middle_found = count(middle)
+        if middle_found >= want:
+            width, found = middle, middle_found
+        else:
+            narrow = middle
+    return window(width)
+
+def _created_range(lo, hi):
+    return [{"created": {"$gte": lo}}, {"created": {"$lt": hi}}]
+
+def _and(conditions):
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
 def create_entry(issues):
   
     # Create document text
     doc_texts = document(issues)
     
     # Generate embeddings in batch 
-    embeddings = get_embedding_bedrock_batch(doc_texts)
+    embeddings = embed_texts(doc_texts)
+
+    metadatas = create_metadatas(issues, doc_texts)
+    
+    return doc_texts, embeddings, metadatas
+
+def create_metadatas(issues, doc_texts):
 
     # Create URLs with consistent format
     issue_urls = [f"https://qnap-jira.qnap.com.tw/browse/{issue.get('key')}" for issue in issues]
@@ -132,8 +618,12 @@ def create_entry(issues):
             'comment': issue.get('comment'),
             'comment_num':issue.get('comment_num'),
             'assignee': issue.get('assignee'),
-            'url': issue_urls[i]
+            'url': issue_urls[i],
+            'fingerprint': fingerprint(issue),
+            'doc_hash': text_hash(doc_texts[i])
         }
+        # Always written, metadata updates merge so a missing key would keep an old True
+        metadata['chunked'] = CHUNKING
         metadatas.append(metadata)
     
-    return doc_texts, embeddings, metadatas
\ No newline at end of file
+    return metadatas
@@ -0,0 +1,196 @@
+"""
+Report how much smaller the vector index can get and what it costs in recall.
+
+    python -m db.compact --k 10 --queries 200 --rerank 4
+    python -m db.compact --dimensions 512 --target jira_issues_512
+
+Without --target the stored full-precision vectors are quantized to float16
+and int8 in memory. The report shows their index size and recall@k against
+exact search, with and without a full-precision rerank of the top k * rerank
+candidates. Chroma only stores float32 vectors, so these rows show what a
+quantized store would give before adopting one.
+
+With --dimensions and --target the stored documents are embedded again with
+EMBEDDING_DIMENSIONS set to --dimensions. The new vectors go into a new
+collection, which is compared against exact search on the full vectors. Only
+models with selectable output size (like Titan v2) support this. Comment
+chunks in <source>_chunks are embedded again into <target>_chunks too. Point
+COLLECTION_NAME at the target and set EMBEDDING_DIMENSIONS to serve from it.
+"""
+import argparse
+import os
+import chromadb
+import numpy as np
+from dotenv import load_dotenv
+from db.rebuild import create_collection, get_collection
+from util.logger import get_logger
+
+logger = get_logger(__name__)
+
+READ_BATCH_SIZE = 1000
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Report memory and recall of compact vector storage")
+    parser.add_argument('--source', default=os.getenv('COLLECTION_NAME'), help="Collection to read, defaults to COLLECTION_NAME")
+    parser.add_argument('--dimensions', type=int, help="Embed again with this output size")
+    parser.add_argument('--target', help="Collection to write the reduced embeddings to, needs --dimensions")
+    parser.add_argument('--replace', action='store_true', help="Delete the target first if it exists")
+    parser.add_argument('--k', type=int, default=10, help="Results per query for recall@k")
+    parser.add_argument('--queries', type=int, default=200, help="Number of stored vectors used as queries")
+    parser.add_argument('--rerank', type=int, default=4, help="Candidates reranked in full precision, as a multiple of k")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    if bool(args.dimensions) != bool(args.target):
+        parser.error("--dimensions and --target go together")
+    # --replace would delete the collection being read, or the one being served
+    if args.target and args.target in (args.source, os.getenv('COLLECTION_NAME')):
+        parser.error("--target must differ from --source and COLLECTION_NAME")
+
+    client = chromadb.PersistentClient(path=os.getenv('CHROMA_DIR'))
+    source = client.get_collection(name=args.source)
+    settings = source.metadata or {}
+    space = settings.get('hnsw:space', 'l2')
+    m = settings.get('hnsw:M', 16)
+
+    ids, documents, metadatas, vectors = read_collection(source)
+    if not ids:
+        print(f"Collection {args.source} is empty")
+        return
+    k = min(args.k, len(ids))
+    rng = np.random.default_rng(args.seed)
+    query_indexes = rng.choice(len(ids), size=min(args.queries, len(ids)), replace=False)
+    queries = vectors[query_indexes]
+    exact = top_k(vectors, queries, k, space)
+
+    rows = [('float32 (stored)', vectors.shape[1], 4, 1.0, None)]
+    for name, quantized, bytes_per_value in (('float16', to_float16(vectors), 2), ('int8', to_int8(vectors), 1)):
+        candidates = top_k(quantized, queries, k * args.rerank, space)
+        reranked = rerank(vectors, queries, candidates, k, space)
+        rows.append((name, vectors.shape[1], bytes_per_value,
+                     recall(exact, candidates[:, :k]), recall(exact, reranked)))
+
+    if args.target:
+        reduced = reembed(documents, args.dimensions)
+        write_collection(client, args.target, args.replace, settings, ids, documents, metadatas, reduced)
+        # The chunks are only written when comments change, so a sync would never restore them
+        source_chunks = get_collection(client, f"{args.source}_chunks")
+        if source_chunks is not None:
+            chunk_ids, chunk_documents, chunk_metadatas, _ = read_collection(source_chunks)
+            if chunk_ids:
+                write_collection(client, f"{args.target}_chunks", args.replace, source_chunks.metadata or {},
+                                 chunk_ids, chunk_documents, chunk_metadatas, reembed(chunk_documents, args.dimensions))
+        reduced_results = top_k(reduced, reduced[query_indexes], k, space)
+        rows.append((f"float32 @ {args.dimensions} dims", reduced.shape[1], 4, recall(exact, reduced_results), None))
+
+    print_report(rows, len(ids), m, k, len(query_indexes), args.rerank)
+
+
+def read_collection(collection):
+    """Read every record of a collection, vectors as one float32 matrix."""
+    ids, documents, metadatas, vectors = [], [], [], []
+    offset = 0
+    while True:
+        batch = collection.get(include=["embeddings", "documents", "metadatas"], limit=READ_BATCH_SIZE, offset=offset)
+        if not batch['ids']:
+            break
+        ids.extend(batch['ids'])
+        documents.extend(batch['documents'])
+        metadatas.extend(batch['metadatas'])
+        vectors.append(np.asarray(batch['embeddings'], dtype=np.float32))
+        if len(batch['ids']) < READ_BATCH_SIZE:
+            break
+        offset += READ_BATCH_SIZE
+    return ids, documents, metadatas, np.vstack(vectors) if vectors else None
+
+
+def to_float16(vectors):
+    return vectors.astype(np.float16).astype(np.float32)
+
+
+def to_int8(vectors):
+    """Symmetric per-vector int8 quantization, returned dequantized for search."""
+    scales = np.clip(np.abs(vectors).max(axis=1, keepdims=True), 1e-12, None) / 127
+    return np.round(vectors / scales).astype(np.int8).astype(np.float32) * scales
+
+
+def distances(database, queries, space):
+    """Distance of every query to every database vector, smaller is closer."""
+    dots = queries @ database.T
+    if space == 'l2':
+        return (database * database).sum(axis=1)[None, :] - 2 * dots + (queries * queries).sum(axis=1)[:, None]
+    if space == 'cosine':
+        norms = np.linalg.norm(database, axis=1)[None, :] * np.linalg.norm(queries, axis=1)[:, None]
+        return 1 - dots / np.clip(norms, 1e-12, None)
+    return 1 - dots
+
+
+def top_k(database, queries, k, space):
+    k = min(k, len(database))
+    d = distances(database, queries, space)
+    top = np.argpartition(d, k - 1, axis=1)[:, :k]
+    order = np.argsort(np.take_along_axis(d, top, axis=1), axis=1)
+    return np.take_along_axis(top, order, axis=1)
+
+
+def rerank(vectors, queries, candidates, k, space):
+    """Order each query's candidates by their full-precision distance and keep the top k."""
+    ret = []
+    for query, row in zip(queries, candidates):
+        d = distances(vectors[row], query[None, :], space)[0]
+        ret.append(row[np.argsort(d)[:k]])
+    return np.array(ret)
+
+
+def recall(exact, found):
+    hits = sum(len(set(e) & set(f)) for e, f in zip(exact, found))
+    return hits / exact.size
+
+
+def reembed(documents, dimensions):
+    """Embed the stored documents again at the requested output size."""
+    os.environ['EMBEDDING_DIMENSIONS'] = str(dimensions)
+    import models.bedrock
+    import models.embedding
+    models.bedrock.init()
+    models.embedding.init()
+    if models.embedding.dimension() != dimensions:
+        raise RuntimeError(f"EMBEDDING_PROVIDER {models.embedding.EMBEDDING_PROVIDER} can't produce {dimensions} dimensions")
+    return np.asarray(models.embedding.embed_texts([document or '' for document in documents]), dtype=np.float32)
+
+
+def write_collection(client, name, replace, settings, ids, documents, metadatas, vectors):
+    import models.embedding
+    metadata = dict(settings)
+    metadata['embedding_model'] = models.embedding.model_id()
+    metadata['embedding_dimension'] = vectors.shape[1]
+    target = create_collection(client, name, metadata, replace)
+    for i in range(0, len(ids), READ_BATCH_SIZE):
+        target.add(
+            ids=ids[i:i + READ_BATCH_SIZE],
+            embeddings=vectors[i:i + READ_BATCH_SIZE],
+            documents=documents[i:i + READ_BATCH_SIZE],
+            metadatas=metadatas[i:i + READ_BATCH_SIZE]
+        )
+    logger.info(f"Wrote {len(ids)} records to {name}")
+
+
+def print_report(rows, n_vectors, m, k, n_queries, rerank_factor):
+    # Each node keeps about 2 * M neighbour ids of 4 bytes on the base layer of the HNSW graph
+    graph_bytes = n_vectors * 2 * m * 4
+    baseline = None
+    print(f"\n{n_vectors} vectors, M={m}, {n_queries} queries, k={k}")
+    print(f"{'storage':<22} {'dims':>5} {'vectors MB':>10} {'+graph MB':>10} {'saved':>6} "
+          f"{'recall@' + str(k):>9} {'rerank x' + str(rerank_factor):>10}")
+    for name, dims, bytes_per_value, found_recall, reranked_recall in rows:
+        vector_bytes = n_vectors * dims * bytes_per_value
+        total = vector_bytes + graph_bytes
+        baseline = baseline or total
+        reranked = f"{reranked_recall:>10.3f}" if reranked_recall is not None else f"{'-':>10}"
+        print(f"{name:<22} {dims:>5} {vector_bytes / 2 ** 20:>10.1f} {total / 2 ** 20:>10.1f} "
+              f"{1 - total / baseline:>6.0%} {found_recall:>9.3f} {reranked}")
+
+
+if __name__ == '__main__':
+    main()
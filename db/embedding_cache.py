@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from util.logger import get_logger
+from util.txt_process import text_hash
+
+logger = get_logger(__name__)
+
+CONN = None
+MAX_ENTRIES = 0
+
+# Max number of SQL parameters per statement
+_SQL_BATCH_SIZE = 500
+
+_LOCK = threading.Lock()
+_entries = 0
+_hits = 0
+_misses = 0
+
+
+def init():
+    """Open the on-disk embedding cache, EMBEDDING_CACHE_MAX_ENTRIES=0 disables it."""
+    global CONN
+    global MAX_ENTRIES
+    global _entries
+    CHROMA_DIR = os.getenv('CHROMA_DIR', '.')
+    CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH') or os.path.join(CHROMA_DIR, 'embedding_cache.sqlite3')
+    MAX_ENTRIES = int(os.getenv('EMBEDDING_CACHE_MAX_ENTRIES', 200000))
+    if MAX_ENTRIES <= 0:
+        logger.info("Embedding cache disabled")
+        return
+
+    with _LOCK:
+        CONN = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        CONN.execute("PRAGMA journal_mode=WAL")
+        CONN.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, "
+            "text_hash TEXT NOT NULL, "
+            "vector BLOB NOT NULL, "
+            "last_used REAL NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        CONN.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        CONN.commit()
+        _entries = CONN.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    logger.info(f"Embedding cache: {CACHE_PATH}, {_entries} entries, max {MAX_ENTRIES}")
+
+
+def get(model, text):
+    return get_many(model, [text])[0]
+
+
+def get_many(model, texts):
+    """
+    Look up cached embeddings.
+
+    Returns:
+        list: One embedding per text, None for texts that are not cached.
+    """
+    global _hits
+    global _misses
+    if CONN is None:
+        return [None] * len(texts)
+
+    hashes = [text_hash(text) for text in texts]
+    found = {}
+    with _LOCK:
+        for i in range(0, len(hashes), _SQL_BATCH_SIZE):
+            batch = list(set(hashes[i:i + _SQL_BATCH_SIZE]))
+            rows = CONN.execute(
+                f"SELECT text_hash, vector FROM embeddings WHERE model = ? "
+                f"AND text_hash IN ({','.join('?' * len(batch))})",
+                [model, *batch]
+            ).fetchall()
+            found.update(rows)
+        if found:
+            now = time.time()
+            CONN.executemany(
+                "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                [(now, model, h) for h in found]
+            )
+            CONN.commit()
+        ret = [_decode(found[h]) if h in found else None for h in hashes]
+        hits = sum(1 for embedding in ret if embedding is not None)
+        _hits += hits
+        _misses += len(ret) - hits
+    return ret
+
+
+def put(model, text, embedding):
+    put_many(model, [text], [embedding])
+
+
+def put_many(model, texts, embeddings):
+    global _entries
+    if CONN is None or not texts:
+        return
+
+    now = time.time()
+    rows = [(model, text_hash(text), _encode(embedding), now) for text, embedding in zip(texts, embeddings)]
+    with _LOCK:
+        # The same text always embeds to the same vector, so existing rows are kept
+        cursor = CONN.executemany(
+            "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+            rows
+        )
+        _entries += max(cursor.rowcount, 0)
+        if _entries > MAX_ENTRIES:
+            _evict()
+        CONN.commit()
+
+
+def _evict():
+    """Drop the least recently used entries, down to 90% of the limit."""
+    global _entries
+    to_delete = _entries - int(MAX_ENTRIES * 0.9)
+    CONN.execute(
+        "DELETE FROM embeddings WHERE rowid IN "
+        "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+        (to_delete,)
+    )
+    _entries = CONN.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    logger.info(f"Evicted {to_delete} embeddings from cache")
+
+
+def stats():
+    with _LOCK:
+        return {
+            'hits': _hits,
+            'misses': _misses,
+            'entries': _entries,
+            'max_entries': MAX_ENTRIES,
+        }
+
+
+def _encode(embedding):
+    return array('f', embedding).tobytes()
+
+
+def _decode(blob):
+    vector = array('f')
+    vector.frombytes(blob)
+    return vector.tolist()
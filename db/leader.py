@@ -0,0 +1,131 @@
+"""
+Leader election between processes sharing one CHROMA_DIR.
+
+With LEADER_ELECTION=true only the process holding the lock file syncs and
+writes. The others are read-only followers, they reopen the store when the
+leader publishes a new generation. The lock is released by the OS when the
+leader exits, so a follower takes over on its next poll.
+"""
+import json
+import os
+import threading
+import time
+from filelock import FileLock, Timeout
+from util import metrics
+from util.logger import get_logger
+
+logger = get_logger(__name__)
+
+ENABLED = False
+LOCK = None
+GENERATION_PATH = None
+# Seconds between the checks of a follower for a new generation or a missing leader
+POLL_SECONDS = 10
+
+_IS_LEADER = False
+# Generation of the store this process has open
+_generation = None
+_STATE_LOCK = threading.Lock()
+
+
+def init():
+    global ENABLED, LOCK, GENERATION_PATH, POLL_SECONDS, _generation
+    ENABLED = os.getenv('LEADER_ELECTION', 'false').lower() == 'true'
+    if not ENABLED:
+        return
+    CHROMA_DIR = os.getenv('CHROMA_DIR', '.')
+    # Not thread-local, the lock is taken at startup and checked from the sync thread
+    LOCK = FileLock(os.getenv('LEADER_LOCK_PATH') or os.path.join(CHROMA_DIR, 'leader.lock'), thread_local=False)
+    GENERATION_PATH = os.path.join(CHROMA_DIR, 'generation.json')
+    POLL_SECONDS = int(os.getenv('LEADER_POLL_SECONDS', 10))
+    _generation = read_generation()
+    metrics.register_gauge('issue_search_sync_leader', 'Whether this process is the sync leader',
+                           lambda: int(is_leader()))
+    if not elect():
+        logger.info(f"Process {os.getpid()} is a read-only follower at generation {_generation}")
+
+
+def is_leader():
+    return not ENABLED or _IS_LEADER
+
+
+def elect():
+    """
+    Take the leader lock if no other process holds it.
+
+    Returns:
+        bool: Whether this process is the leader.
+    """
+    global _IS_LEADER
+    if not ENABLED:
+        return True
+    with _STATE_LOCK:
+        if _IS_LEADER:
+            return True
+        try:
+            LOCK.acquire(timeout=0)
+        except Timeout:
+            return False
+        _IS_LEADER = True
+    logger.info(f"Process {os.getpid()} is the sync leader")
+    return True
+
+
+def check_writable():
+    """
+    Called by every function that writes the store or the sync state.
+
+    Chroma has no read-only mode, followers open the same directory with a
+    writable client, so this is what keeps them from writing.
+    """
+    if not is_leader():
+        raise RuntimeError("This process is a read-only follower, only the sync leader writes")
+
+
+def read_generation():
+    try:
+        with open(GENERATION_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f).get('generation')
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to read {GENERATION_PATH}: {e}")
+        return _generation
+
+
+def publish():
+    """Tell the followers that the store changed, called by the leader after writing."""
+    global _generation
+    if not ENABLED:
+        return
+    generation = (read_generation() or 0) + 1
+    # Write to a temp file first so followers never read a half-written file
+    tmp_path = f"{GENERATION_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'generation': generation, 'leader_pid': os.getpid(), 'published': time.time()}, f)
+    os.replace(tmp_path, GENERATION_PATH)
+    _generation = generation
+    logger.info(f"Published generation {generation}")
+
+
+def follow():
+    """
+    Reopen the store and rebuild the lexical index if another process
+    published a newer generation than the one this process has open.
+
+    Returns:
+        bool: Whether the store was reopened.
+    """
+    global _generation
+    if not ENABLED:
+        return False
+    generation = read_generation()
+    if generation is None or generation == _generation:
+        return False
+    logger.info(f"Generation changed from {_generation} to {generation}, reopening the store")
+    # Imported here, db.chroma checks this module before every write
+    from db import chroma, lexical
+    chroma.reload()
+    lexical.init()
+    _generation = generation
+    return True
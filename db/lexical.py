@@ -0,0 +1,194 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from util.logger import get_logger
+
+logger = get_logger(__name__)
+
+# In-process BM25 index over the key, summary, description and comment of the stored issues
+ENABLED = False
+LOCK = threading.RLock()
+# term -> {issue key: term frequency}
+POSTINGS = {}
+# issue key -> Counter of its terms, needed to remove the old postings on update
+DOC_TERMS = {}
+# issue key -> number of terms
+DOC_LENGTHS = {}
+TOTAL_LENGTH = 0
+
+INDEXED_FIELDS = ('key', 'summary', 'description', 'comment')
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Runs of CJK characters, indexed as overlapping character bigrams since they have no word breaks
+CJK_PATTERN = r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]+'
+# Words, including dotted or dashed compounds like module names and issue keys
+WORD_PATTERN = r'[0-9a-z_]+(?:[.\-/:][0-9a-z_]+)*'
+TOKEN_RE = re.compile(f'({CJK_PATTERN})|({WORD_PATTERN})')
+WORD_SPLIT_RE = re.compile(r'[.\-/:]')
+
+
+def init():
+    global ENABLED
+    ENABLED = os.getenv('LEXICAL_INDEX', 'true').lower() == 'true'
+    if not ENABLED:
+        logger.info("Lexical index is disabled")
+        return
+    # Imported here, db.chroma updates this index on every write
+    from db.chroma import iter_metadatas
+    start = time.time()
+    count = rebuild(iter_metadatas())
+    from util import metrics
+    metrics.register_gauge('issue_search_lexical_index_issues', 'Issues in the lexical index', lambda: len(DOC_TERMS))
+    logger.info(f"Lexical index built with {count} issues and {len(POSTINGS)} terms in {time.time() - start:.1f}s")
+
+
+def tokenize(text):
+    """
+    Split text into index terms.
+
+    Latin words are lowercased, compounds like 'PROJ-123' or 'db.chroma' are
+    kept as a whole and also split into their parts. CJK runs become
+    character bigrams, a single CJK character stays a unigram.
+    """
+    terms = []
+    if not text:
+        return terms
+    for cjk, word in TOKEN_RE.findall(str(text).lower()):
+        if cjk:
+            if len(cjk) == 1:
+                terms.append(cjk)
+            else:
+                terms.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            terms.append(word)
+            parts = WORD_SPLIT_RE.split(word)
+            if len(parts) > 1:
+                terms.extend(part for part in parts if part)
+    return terms
+
+
+def index_metadatas(metadatas):
+    """Add or replace issues in the index from their stored metadata, returns the number indexed."""
+    if not ENABLED:
+        return 0
+    count = 0
+    with LOCK:
+        for metadata in metadatas:
+            key = metadata.get('key') if metadata else None
+            if not key:
+                continue
+            _replace(key, _terms(metadata))
+            count += 1
+    return count
+
+
+def rebuild(metadatas):
+    """
+    Build a new index from the stored metadata and swap it in.
+
+    Searches keep using the current index until the new one is complete.
+    Updates made through index_metadatas while it is built are not in the
+    new index, so it is only rebuilt when nothing else writes: at startup
+    and on followers, which never write.
+
+    Returns:
+        int: The number of issues read.
+    """
+    global POSTINGS, DOC_TERMS, DOC_LENGTHS, TOTAL_LENGTH
+    postings = {}
+    doc_terms = {}
+    doc_lengths = {}
+    count = 0
+    for metadata in metadatas:
+        key = metadata.get('key') if metadata else None
+        if not key:
+            continue
+        count += 1
+        terms = _terms(metadata)
+        if not terms:
+            continue
+        doc_terms[key] = terms
+        doc_lengths[key] = sum(terms.values())
+        for term, tf in terms.items():
+            postings.setdefault(term, {})[key] = tf
+
+    with LOCK:
+        POSTINGS, DOC_TERMS, DOC_LENGTHS = postings, doc_terms, doc_lengths
+        TOTAL_LENGTH = sum(doc_lengths.values())
+    return count
+
+
+def _terms(metadata):
+    return Counter(tokenize(' '.join(str(metadata.get(field) or '') for field in INDEXED_FIELDS)))
+
+
+def remove(keys):
+    if not ENABLED:
+        return
+    with LOCK:
+        for key in keys:
+            _replace(key, None)
+
+
+def clear():
+    global TOTAL_LENGTH
+    with LOCK:
+        POSTINGS.clear()
+        DOC_TERMS.clear()
+        DOC_LENGTHS.clear()
+        TOTAL_LENGTH = 0
+
+
+def _replace(key, terms):
+    global TOTAL_LENGTH
+    old = DOC_TERMS.pop(key, None)
+    if old:
+        TOTAL_LENGTH -= DOC_LENGTHS.pop(key)
+        for term in old:
+            postings = POSTINGS.get(term)
+            if postings is not None:
+                postings.pop(key, None)
+                if not postings:
+                    del POSTINGS[term]
+    if terms:
+        DOC_TERMS[key] = terms
+        DOC_LENGTHS[key] = sum(terms.values())
+        TOTAL_LENGTH += DOC_LENGTHS[key]
+        for term, tf in terms.items():
+            POSTINGS.setdefault(term, {})[key] = tf
+
+
+def search(text, n_results=5):
+    """
+    Rank the indexed issues against a query text with BM25.
+
+    Returns:
+        list: (issue key, score) tuples, best first.
+    """
+    terms = Counter(tokenize(text))
+    with LOCK:
+        n_docs = len(DOC_TERMS)
+        if not n_docs or not terms:
+            return []
+        avg_length = TOTAL_LENGTH / n_docs
+        scores = {}
+        for term, query_tf in terms.items():
+            postings = POSTINGS.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for key, tf in postings.items():
+                norm = tf * (K1 + 1) / (tf + K1 * (1 - B + B * DOC_LENGTHS[key] / avg_length))
+                scores[key] = scores.get(key, 0.0) + query_tf * idf * norm
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:n_results]
+
+
+def stats():
+    with LOCK:
+        return {'enabled': ENABLED, 'issues': len(DOC_TERMS), 'terms': len(POSTINGS)}
@@ -0,0 +1,170 @@
+"""
+Copy the issue collection into a new collection with other HNSW settings and
+compare recall@k and query latency of both against exact brute-force search.
+
+    python -m db.rebuild --target jira_issues_m32 --m 32 --construction-ef 200 --search-ef 128
+
+Settings that are not given come from the HNSW_* environment variables. The
+comment chunks of ISSUE_CHUNKING, <source>_chunks, are copied to <target>_chunks
+with the same settings. Point COLLECTION_NAME at the target to serve from it.
+"""
+import argparse
+import os
+import time
+import chromadb
+import numpy as np
+from dotenv import load_dotenv
+from util.logger import get_logger
+
+logger = get_logger(__name__)
+
+COPY_BATCH_SIZE = 1000
+
+
+def main():
+    load_dotenv()
+    from db.chroma import hnsw_metadata
+
+    parser = argparse.ArgumentParser(description="Rebuild the issue collection with new HNSW settings")
+    parser.add_argument('--source', default=os.getenv('COLLECTION_NAME'), help="Collection to copy, defaults to COLLECTION_NAME")
+    parser.add_argument('--target', required=True, help="Name of the new collection")
+    parser.add_argument('--replace', action='store_true', help="Delete the target first if it exists")
+    parser.add_argument('--m', type=int, help="HNSW M, links per node")
+    parser.add_argument('--construction-ef', type=int, help="HNSW ef used while inserting")
+    parser.add_argument('--search-ef', type=int, help="HNSW ef used while searching")
+    parser.add_argument('--num-threads', type=int, help="Threads used to insert")
+    parser.add_argument('--k', type=int, default=10, help="Results per query for recall@k")
+    parser.add_argument('--queries', type=int, default=200, help="Number of stored vectors used as queries")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    # --replace would delete the collection being copied, or the one being served
+    if args.target in (args.source, os.getenv('COLLECTION_NAME')):
+        parser.error("--target must differ from --source and COLLECTION_NAME")
+
+    client = chromadb.PersistentClient(path=os.getenv('CHROMA_DIR'))
+    source = client.get_collection(name=args.source)
+
+    metadata = {name: value for name, value in (source.metadata or {}).items() if not name.startswith('hnsw:')}
+    hnsw = hnsw_metadata()
+    # The distance function must match the source or the comparison is meaningless
+    hnsw['hnsw:space'] = (source.metadata or {}).get('hnsw:space', 'l2')
+    for name, value in (('hnsw:M', args.m), ('hnsw:construction_ef', args.construction_ef),
+                        ('hnsw:search_ef', args.search_ef), ('hnsw:num_threads', args.num_threads)):
+        if value is not None:
+            hnsw[name] = value
+    metadata.update(hnsw)
+
+    target = create_collection(client, args.target, metadata, args.replace)
+    ids, vectors, copy_seconds = copy_collection(source, target)
+    print(f"Copied {len(ids)} issues from {args.source} to {args.target} in {copy_seconds:.1f}s")
+
+    # The chunks are only written when comments change, so a sync would never restore them
+    source_chunks = get_collection(client, f"{args.source}_chunks")
+    if source_chunks is not None:
+        target_chunks = create_collection(client, f"{args.target}_chunks", metadata, args.replace)
+        chunk_ids, _, chunk_seconds = copy_collection(source_chunks, target_chunks)
+        print(f"Copied {len(chunk_ids)} comment chunks to {args.target}_chunks in {chunk_seconds:.1f}s")
+    if not ids:
+        return
+
+    rng = np.random.default_rng(args.seed)
+    query_indexes = rng.choice(len(ids), size=min(args.queries, len(ids)), replace=False)
+    exact, exact_latencies = brute_force(vectors, ids, query_indexes, args.k, hnsw['hnsw:space'])
+
+    rows = [('brute force', '-', '-', '-', 1.0, exact_latencies)]
+    for name, collection in ((args.source, source), (args.target, target)):
+        recall, latencies = evaluate(collection, vectors, query_indexes, exact, args.k)
+        settings = collection.metadata or {}
+        rows.append((name, settings.get('hnsw:M', 16), settings.get('hnsw:construction_ef', 100),
+                     settings.get('hnsw:search_ef', 10), recall, latencies))
+    print_report(rows, args.k, len(query_indexes))
+
+
+def get_collection(client, name):
+    """The collection called name, None if it doesn't exist."""
+    try:
+        return client.get_collection(name=name)
+    except (chromadb.errors.NotFoundError, ValueError):
+        return None
+
+
+def create_collection(client, name, metadata, replace=False):
+    if replace:
+        try:
+            client.delete_collection(name=name)
+        except (chromadb.errors.NotFoundError, ValueError):
+            pass
+    return client.create_collection(name=name, metadata=metadata)
+
+
+def copy_collection(source, target):
+    """Copy every record with its stored embedding, returns the ids and vectors for brute force."""
+    start = time.time()
+    all_ids = []
+    all_vectors = []
+    offset = 0
+    while True:
+        batch = source.get(include=["embeddings", "documents", "metadatas"], limit=COPY_BATCH_SIZE, offset=offset)
+        if not batch['ids']:
+            break
+        target.add(
+            ids=batch['ids'],
+            embeddings=batch['embeddings'],
+            documents=batch['documents'],
+            metadatas=batch['metadatas']
+        )
+        all_ids.extend(batch['ids'])
+        all_vectors.append(np.asarray(batch['embeddings'], dtype=np.float32))
+        logger.info(f"Copied {len(all_ids)} records")
+        if len(batch['ids']) < COPY_BATCH_SIZE:
+            break
+        offset += COPY_BATCH_SIZE
+    vectors = np.vstack(all_vectors) if all_vectors else np.empty((0, 0), dtype=np.float32)
+    return all_ids, vectors, time.time() - start
+
+
+def brute_force(vectors, ids, query_indexes, k, space):
+    """Exact top-k ids per query vector with the collection's distance function."""
+    if space == 'cosine':
+        vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    squared_norms = (vectors * vectors).sum(axis=1)
+    exact = []
+    latencies = []
+    for i in query_indexes:
+        start = time.perf_counter()
+        dots = vectors @ vectors[i]
+        if space == 'l2':
+            distances = squared_norms - 2 * dots + squared_norms[i]
+        else:
+            # cosine on normalized vectors and ip both rank by the largest dot product
+            distances = -dots
+        top = np.argpartition(distances, min(k, len(ids) - 1))[:k]
+        top = top[np.argsort(distances[top])]
+        latencies.append(time.perf_counter() - start)
+        exact.append({ids[j] for j in top})
+    return exact, latencies
+
+
+def evaluate(collection, vectors, query_indexes, exact, k):
+    """recall@k against the exact results, and the latency of each query."""
+    hits = 0
+    latencies = []
+    for n, i in enumerate(query_indexes):
+        start = time.perf_counter()
+        results = collection.query(query_embeddings=[vectors[i]], n_results=k, include=[])
+        latencies.append(time.perf_counter() - start)
+        hits += len(exact[n] & set(results['ids'][0]))
+    return hits / (len(query_indexes) * min(k, len(vectors))), latencies
+
+
+def print_report(rows, k, n_queries):
+    print(f"\n{n_queries} queries, k={k}")
+    print(f"{'collection':<28} {'M':>4} {'constr_ef':>9} {'search_ef':>9} {'recall@' + str(k):>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, m, construction_ef, search_ef, recall, latencies in rows:
+        latencies_ms = np.asarray(latencies) * 1000
+        print(f"{name:<28} {m:>4} {construction_ef:>9} {search_ef:>9} {recall:>9.3f} "
+              f"{np.percentile(latencies_ms, 50):>8.2f} {np.percentile(latencies_ms, 99):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+import json
+import os
+import threading
+from util.logger import get_logger
+
+logger = get_logger(__name__)
+
+STATE_PATH = None
+_LOCK = threading.Lock()
+
+
+def init():
+    global STATE_PATH
+    CHROMA_DIR = os.getenv('CHROMA_DIR', '.')
+    STATE_PATH = os.getenv('SYNC_STATE_PATH') or os.path.join(CHROMA_DIR, 'sync_state.json')
+    logger.info(f"Sync state file: {STATE_PATH}")
+
+
+def _load():
+    try:
+        with open(STATE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Failed to read sync state {STATE_PATH}, ignoring it: {e}")
+        return {}
+
+
+def _save(state):
+    # Write to a temp file first so a crash never leaves a half-written state
+    tmp_path = f"{STATE_PATH}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, STATE_PATH)
+
+
+def get_watermark(query):
+    """
+    Get the start time of the last successful sync of a JQL query.
+
+    Returns:
+        float | None: Unix timestamp, or None if the query was never synced.
+    """
+    with _LOCK:
+        return _load().get('watermarks', {}).get(query)
+
+
+def set_watermark(query, timestamp):
+    with _LOCK:
+        state = _load()
+        state.setdefault('watermarks', {})[query] = timestamp
+        _save(state)
+
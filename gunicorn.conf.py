@@ -0,0 +1,24 @@
+"""
+Gunicorn settings, read from the working directory when gunicorn starts:
+
+    PROMETHEUS_MULTIPROC_DIR=/tmp/issue_search_metrics LEADER_ELECTION=true gunicorn -w 4 --threads 8 -b 0.0.0.0:8080 wsgi:app
+
+With PROMETHEUS_MULTIPROC_DIR set, /metrics sums the counters and histograms of
+every worker, see util.metrics.
+"""
+import os
+import shutil
+
+
+def on_starting(server):
+    # Files of an earlier run would be added to the new counts
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
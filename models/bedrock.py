@@ -0,0 +1,95 @@
+import os
+import time
+from contextlib import contextmanager
+from urllib.parse import unquote
+import boto3
+from botocore.config import Config
+from models.scheduler import is_throttling_error, THROTTLING_ERROR_CODES
+from util import metrics
+from util.logger import get_logger
+
+# Process-wide bedrock-runtime client, boto3 clients are thread-safe
+CLIENT = None
+# Same client without botocore retries, for calls the EmbeddingScheduler retries and backs off itself
+SCHEDULED_CLIENT = None
+
+# Model id -> 'embedding' or 'suggestion', labels the throttled attempts seen by botocore
+MODEL_PURPOSES = {}
+
+logger = get_logger(__name__)
+
+def init():
+    global CLIENT, SCHEDULED_CLIENT
+    BEDROCK_REGION = os.getenv('BEDROCK_REGION')
+    BEDROCK_ACCESS_KEY_ID = os.getenv('BEDROCK_ACCESS_KEY_ID')
+    BEDROCK_SECRET_ACCESS_KEY = os.getenv('BEDROCK_SECRET_ACCESS_KEY')
+
+    # The pool should be at least as large as the number of concurrent Bedrock calls
+    max_pool_connections = int(os.getenv('BEDROCK_MAX_POOL_CONNECTIONS', 50))
+    config = Config(
+        max_pool_connections=max_pool_connections,
+        connect_timeout=int(os.getenv('BEDROCK_CONNECT_TIMEOUT', 5)),
+        read_timeout=int(os.getenv('BEDROCK_READ_TIMEOUT', 60)),
+        retries={
+            'mode': 'adaptive',
+            'max_attempts': int(os.getenv('BEDROCK_MAX_ATTEMPTS', 5)),
+        },
+        tcp_keepalive=True,
+    )
+
+    def create_client(config):
+        client = boto3.client(
+            service_name="bedrock-runtime",
+            region_name=BEDROCK_REGION,
+            # Only set to point at another endpoint, like the benchmark stub
+            endpoint_url=os.getenv('BEDROCK_ENDPOINT_URL') or None,
+            aws_access_key_id=BEDROCK_ACCESS_KEY_ID,
+            aws_secret_access_key=BEDROCK_SECRET_ACCESS_KEY,
+            config=config,
+        )
+        # Count every throttled attempt, botocore retries most of them before we see an error
+        client.meta.events.register('needs-retry.bedrock-runtime', _count_throttled_attempt)
+        return client
+
+    CLIENT = create_client(config)
+    # One attempt only, so throttles reach the scheduler's adaptive limiter and retries don't multiply
+    SCHEDULED_CLIENT = create_client(config.merge(Config(retries={'mode': 'standard', 'max_attempts': 1})))
+    logger.info(f"Bedrock client created with {max_pool_connections} pooled connections")
+
+
+def get_client():
+    return CLIENT
+
+
+def get_scheduled_client():
+    return SCHEDULED_CLIENT
+
+
+def register_model(model_id, purpose):
+    if model_id:
+        MODEL_PURPOSES[model_id] = purpose
+
+
+@contextmanager
+def track(purpose):
+    """Count and time one Bedrock call for the metrics, purpose is 'embedding' or 'suggestion'."""
+    start = time.perf_counter()
+    outcome = 'ok'
+    try:
+        yield
+    except Exception as e:
+        outcome = 'throttled' if is_throttling_error(e) else 'error'
+        raise
+    finally:
+        metrics.BEDROCK_CALLS.labels(purpose, outcome).inc()
+        metrics.BEDROCK_LATENCY.labels(purpose).observe(time.perf_counter() - start)
+
+
+def _count_throttled_attempt(response=None, request_dict=None, **kwargs):
+    if response is None or response[1].get('Error', {}).get('Code') not in THROTTLING_ERROR_CODES:
+        return None
+    path = unquote((request_dict or {}).get('url_path', ''))
+    purpose = next((purpose for model_id, purpose in MODEL_PURPOSES.items() if f'/model/{model_id}/' in path), 'other')
+    metrics.BEDROCK_THROTTLED_ATTEMPTS.labels(purpose).inc()
+    # None leaves the retry decision to botocore
+    return None
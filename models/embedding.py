@@ -2,17 +2,37 @@ import requests
 import os
 from tqdm import tqdm
 import json
-import boto3
 import concurrent.futures
+from cachetools import TTLCache
+from db import embedding_cache
+from models import bedrock
+from models.scheduler import EmbeddingScheduler
+from util import metrics
+from util.cache import MetricsCache
 from util.logger import get_logger
 
 _MODEL = None
 _MODEL_PATH = None
 
-BEDROCK_REGION = None
-BEDROCK_ACCESS_KEY_ID = None
-BEDROCK_SECRET_ACCESS_KEY = None
 BEDROCK_EMBEDDING_MODEL_ID = None
+# Output size requested from models that support it, like Titan v2 (256, 512 or 1024), None for the model default
+EMBEDDING_DIMENSIONS = None
+
+# Backend of embed_text/embed_texts, one of EMBEDDING_PROVIDERS
+EMBEDDING_PROVIDER = 'bedrock'
+EMBEDDING_PROVIDERS = ('bedrock', 'onnx')
+
+# In-memory cache of free-text query embeddings, keyed by normalized query text
+QUERY_CACHE = None
+
+# Shared worker pool for bulk Bedrock embedding calls
+SCHEDULER = None
+
+# Number of finished embeddings written to the cache at once
+CACHE_FLUSH_SIZE = 50
+
+# Truncate text to avoid exceeding model token limits (approx. 30k chars for 8192 tokens)
+MAX_CHARS = 10000
 
 logger = get_logger(__name__)
 
@@ -22,15 +42,46 @@ def init():
     _MODEL_PATH = os.getenv('EMBEDDING_MODEL_PATH')
     _MODEL = os.getenv('EMBEDDING_MODEL')
 
-    global BEDROCK_REGION
-    global BEDROCK_ACCESS_KEY_ID
-    global BEDROCK_SECRET_ACCESS_KEY
     global BEDROCK_EMBEDDING_MODEL_ID
-    BEDROCK_REGION = os.getenv('BEDROCK_REGION')
-    BEDROCK_ACCESS_KEY_ID = os.getenv('BEDROCK_ACCESS_KEY_ID')
-    BEDROCK_SECRET_ACCESS_KEY = os.getenv('BEDROCK_SECRET_ACCESS_KEY')
     BEDROCK_EMBEDDING_MODEL_ID = os.getenv('BEDROCK_EMBEDDING_MODEL_ID')
 
+    global EMBEDDING_DIMENSIONS
+    EMBEDDING_DIMENSIONS = int(os.getenv('EMBEDDING_DIMENSIONS', 0)) or None
+
+    global EMBEDDING_PROVIDER
+    EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'bedrock').lower()
+    if EMBEDDING_PROVIDER not in EMBEDDING_PROVIDERS:
+        raise ValueError(f"Unknown EMBEDDING_PROVIDER '{EMBEDDING_PROVIDER}', expected one of: {', '.join(EMBEDDING_PROVIDERS)}")
+    if EMBEDDING_PROVIDER == 'onnx':
+        # Imported here so onnxruntime is only loaded when it is used
+        from models import onnx_embedding
+        onnx_embedding.init()
+    logger.info(f"Embedding provider: {EMBEDDING_PROVIDER}, model: {model_id()}")
+
+    embedding_cache.init()
+
+    global QUERY_CACHE
+    QUERY_CACHE = MetricsCache(TTLCache(
+        maxsize=int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', 1024)),
+        ttl=int(os.getenv('QUERY_EMBEDDING_CACHE_TTL_SECONDS', 3600))
+    ))
+    metrics.register_cache('query_embedding', QUERY_CACHE.stats)
+    metrics.register_cache('embedding_store', embedding_cache.stats)
+
+    global SCHEDULER
+    if SCHEDULER is None:
+        SCHEDULER = EmbeddingScheduler(
+            max_concurrency=int(os.getenv('EMBEDDING_MAX_CONCURRENCY', 50)),
+            initial_concurrency=int(os.getenv('EMBEDDING_INITIAL_CONCURRENCY', 10)),
+            rate_per_second=float(os.getenv('EMBEDDING_RATE_PER_SECOND', 0)),
+            max_retries=int(os.getenv('EMBEDDING_MAX_RETRIES', 5))
+        )
+        metrics.register_gauge('issue_search_embedding_concurrency_limit', 'Current adaptive limit of concurrent embedding calls',
+                               lambda: SCHEDULER.stats()['concurrency_limit'])
+        metrics.register_gauge('issue_search_embedding_in_flight', 'Embedding calls in flight',
+                               lambda: SCHEDULER.stats()['in_flight'])
+    bedrock.register_model(BEDROCK_EMBEDDING_MODEL_ID, 'embedding')
+
 
 def get_embedding(text):
 
@@ -47,59 +98,130 @@ def get_embedding(text):
 def get_embedding_batch(texts):
     
     embeddings = []
-    for text in tqdm(texts, desc="Generating embeddings", unit="text"):
+    for text in tqdm(texts, desc="Generating embeddings", unit="text", disable=None):
         embedding = get_embedding(text)  
         embeddings.append(embedding)
     return embeddings
 
+def model_id():
+    """Identifier of the configured embedding model, recorded with the collection."""
+    if EMBEDDING_PROVIDER == 'onnx':
+        from models import onnx_embedding
+        return onnx_embedding.MODEL_ID
+    if EMBEDDING_DIMENSIONS and BEDROCK_EMBEDDING_MODEL_ID:
+        # Vectors of another size are a different embedding space, keep them apart in the cache too
+        return f"{BEDROCK_EMBEDDING_MODEL_ID}@{EMBEDDING_DIMENSIONS}"
+    return BEDROCK_EMBEDDING_MODEL_ID
+
+def dimension():
+    """Embedding dimension of the configured model, None when it is only known after a call."""
+    if EMBEDDING_PROVIDER == 'onnx':
+        from models import onnx_embedding
+        return onnx_embedding.DIMENSION
+    return EMBEDDING_DIMENSIONS
+
+def embed_text(text):
+    """Embed one text with the configured provider."""
+    if EMBEDDING_PROVIDER == 'onnx':
+        from models import onnx_embedding
+        return onnx_embedding.embed([truncate(text)])[0]
+    return get_embedding_bedrock(text)
+
+def embed_texts(texts):
+    """Embed many texts with the configured provider, in input order."""
+    if EMBEDDING_PROVIDER == 'onnx':
+        from models import onnx_embedding
+        return onnx_embedding.embed([truncate(text) for text in texts])
+    return get_embedding_bedrock_batch(texts)
+
 def get_embedding_bedrock(text):
 
-    bedrock_runtime = boto3.client(
-        service_name="bedrock-runtime",
-        region_name=BEDROCK_REGION,
-        aws_access_key_id=BEDROCK_ACCESS_KEY_ID,
-        aws_secret_access_key=BEDROCK_SECRET_ACCESS_KEY,
-    )
+    text = truncate(text)
+    embedding = embedding_cache.get(model_id(), text)
+    if embedding is None:
+        embedding = _invoke_embedding_bedrock(text)
+        embedding_cache.put(model_id(), text, embedding)
+    return embedding
 
-    # Truncate text to avoid exceeding model token limits (approx. 30k chars for 8192 tokens)
-    MAX_CHARS = 10000
-    if len(text) > MAX_CHARS:
-        text = text[:MAX_CHARS]
+def get_query_embedding(text):
+    """Embed a free-text search query, repeated queries are served from memory."""
+    return get_query_embeddings([text])[0]
+
+def get_query_embeddings(texts):
+    """Embed many free-text search queries, the ones not in memory are embedded concurrently."""
+    # The key is the text that is embedded, so a cached vector never depends on
+    # which spelling of a query came first. Case is kept, the model sees it.
+    texts = [' '.join(str(text).split()) for text in texts]
+    embeddings = [QUERY_CACHE.get(text) for text in texts]
+
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if len(missing) == 1:
+        # A single query skips the batch scheduler, it is latency sensitive
+        embeddings[missing[0]] = embed_text(texts[missing[0]])
+    elif missing:
+        for i, embedding in zip(missing, embed_texts([texts[i] for i in missing])):
+            embeddings[i] = embedding
+    for i in missing:
+        QUERY_CACHE.set(texts[i], embeddings[i])
+    return embeddings
+
+def _invoke_embedding_bedrock(text, client=None):
 
     payload = {
         "inputText": text
     }
+    if EMBEDDING_DIMENSIONS:
+        payload["dimensions"] = EMBEDDING_DIMENSIONS
     
-    response = bedrock_runtime.invoke_model(
-        body=json.dumps(payload),
-        modelId=BEDROCK_EMBEDDING_MODEL_ID,
-        accept="application/json",
-        contentType="application/json"
-    )
-    response_body = json.loads(response.get('body').read())
+    with bedrock.track('embedding'):
+        response = (client or bedrock.get_client()).invoke_model(
+            body=json.dumps(payload),
+            modelId=BEDROCK_EMBEDDING_MODEL_ID,
+            accept="application/json",
+            contentType="application/json"
+        )
+        response_body = json.loads(response.get('body').read())
     return response_body['embeddingsByType']['float']
 
+def _invoke_embedding_bedrock_scheduled(text):
+    # The scheduler is the only layer that retries, the client makes one attempt
+    return _invoke_embedding_bedrock(text, bedrock.get_scheduled_client())
+
+def truncate(text):
+    if len(text) > MAX_CHARS:
+        return text[:MAX_CHARS]
+    return text
+
 def get_embedding_bedrock_batch(texts):
-    size = len(texts)
-    batch_size = 50
-    num_batches = (size + batch_size - 1) // batch_size
-    embeddings = []
-    
-    for i in tqdm(range(num_batches), desc="Generating embeddings", unit="batch"):
-        batch_start = i * batch_size
-        batch_end = min(batch_start + batch_size, size)
-        batch = texts[batch_start:batch_end]
-
-        batch_embeddings = [None] * len(batch) 
-        
-        with concurrent.futures.ThreadPoolExecutor(max_workers=len(batch)) as executor:
-            future_to_index = {executor.submit(get_embedding_bedrock, text): idx 
-                              for idx, text in enumerate(batch)}
-            
-            for future in concurrent.futures.as_completed(future_to_index):
-                idx = future_to_index[future]
-                batch_embeddings[idx] = future.result()
-        
-        embeddings.extend(batch_embeddings)
+    texts = [truncate(text) for text in texts]
+    embeddings = embedding_cache.get_many(model_id(), texts)
+
+    # Only texts that are not cached go to Bedrock
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if len(missing) < len(texts):
+        logger.info(f"Embedding cache hits: {len(texts) - len(missing)}/{len(texts)}")
+
+    futures = {SCHEDULER.submit(_invoke_embedding_bedrock_scheduled, texts[idx]): idx for idx in missing}
+    done = []
+    try:
+        for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures), desc="Generating embeddings", unit="text", disable=None):
+            idx = futures[future]
+            embeddings[idx] = future.result()
+            done.append(idx)
+            # Cache as we go so a failed run keeps what it paid for
+            if len(done) >= CACHE_FLUSH_SIZE:
+                _cache_embeddings(texts, embeddings, done)
+                done = []
+    finally:
+        for future in futures:
+            future.cancel()
+        _cache_embeddings(texts, embeddings, done)
     
-    return embeddings
\ No newline at end of file
+    return embeddings
+
+def _cache_embeddings(texts, embeddings, indexes):
+    embedding_cache.put_many(
+        model_id(),
+        [texts[idx] for idx in indexes],
+        [embeddings[idx] for idx in indexes]
+    )
@@ -0,0 +1,88 @@
+import os
+import numpy as np
+import onnxruntime as ort
+from tokenizers import Tokenizer
+from util.logger import get_logger
+
+logger = get_logger(__name__)
+
+SESSION = None
+TOKENIZER = None
+INPUT_NAMES = ()
+# Identifies the model in collection metadata, e.g. 'onnx:all-MiniLM-L6-v2'
+MODEL_ID = None
+DIMENSION = None
+
+BATCH_SIZE = 32
+MAX_LENGTH = 512
+NORMALIZE = True
+
+
+def init():
+    """
+    Load a sentence-embedding model exported to ONNX.
+
+    ONNX_MODEL_DIR holds model.onnx and the matching tokenizer.json, as
+    exported by optimum or sentence-transformers.
+    """
+    global SESSION, TOKENIZER, INPUT_NAMES, MODEL_ID, DIMENSION, BATCH_SIZE, MAX_LENGTH, NORMALIZE
+    model_dir = os.getenv('ONNX_MODEL_DIR', 'asset/onnx_model')
+    model_path = os.getenv('ONNX_MODEL_PATH', os.path.join(model_dir, 'model.onnx'))
+    tokenizer_path = os.getenv('ONNX_TOKENIZER_PATH', os.path.join(model_dir, 'tokenizer.json'))
+    MODEL_ID = 'onnx:' + os.getenv('ONNX_MODEL_ID', os.path.basename(os.path.normpath(model_dir)))
+    BATCH_SIZE = int(os.getenv('ONNX_BATCH_SIZE', 32))
+    MAX_LENGTH = int(os.getenv('ONNX_MAX_LENGTH', 512))
+    NORMALIZE = os.getenv('ONNX_NORMALIZE', 'true').lower() == 'true'
+
+    options = ort.SessionOptions()
+    # 0 lets onnxruntime use one thread per physical core
+    options.intra_op_num_threads = int(os.getenv('ONNX_NUM_THREADS', 0))
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    SESSION = ort.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+    INPUT_NAMES = tuple(i.name for i in SESSION.get_inputs())
+
+    TOKENIZER = Tokenizer.from_file(tokenizer_path)
+    TOKENIZER.enable_truncation(max_length=MAX_LENGTH)
+    if TOKENIZER.padding is None:
+        TOKENIZER.enable_padding()
+    else:
+        # Pad to the longest text of each batch, not to a fixed length
+        TOKENIZER.enable_padding(**{**TOKENIZER.padding, 'length': None})
+
+    DIMENSION = len(embed(['dimension probe'])[0])
+    logger.info(f"ONNX embedding model {MODEL_ID} loaded, dimension {DIMENSION}")
+
+
+def embed(texts):
+    """
+    Embed texts on the CPU.
+
+    Texts are sorted by length and run in batches of BATCH_SIZE so each batch
+    is padded as little as possible. Token embeddings are mean pooled over the
+    attention mask, unless the model already outputs pooled sentence embeddings.
+
+    Returns:
+        list: One list of floats per text, in input order.
+    """
+    ret = [None] * len(texts)
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    for start in range(0, len(order), BATCH_SIZE):
+        batch = order[start:start + BATCH_SIZE]
+        encodings = TOKENIZER.encode_batch([texts[i] for i in batch])
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {
+            'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+            'attention_mask': attention_mask,
+        }
+        if 'token_type_ids' in INPUT_NAMES:
+            feeds['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        output = SESSION.run(None, {name: value for name, value in feeds.items() if name in INPUT_NAMES})[0]
+
+        if output.ndim == 3:
+            mask = attention_mask[:, :, None].astype(output.dtype)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if NORMALIZE:
+            output = output / np.clip(np.linalg.norm(output, axis=1, keepdims=True), 1e-12, None)
+        for j, i in enumerate(batch):
+            ret[i] = output[j].astype(np.float32).tolist()
+    return ret
@@ -0,0 +1,146 @@
+import concurrent.futures
+import random
+import threading
+import time
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError, HTTPClientError
+from util.logger import get_logger
+
+logger = get_logger(__name__)
+
+THROTTLING_ERROR_CODES = {
+    'ThrottlingException',
+    'TooManyRequestsException',
+    'ServiceQuotaExceededException',
+}
+
+# Server-side errors that usually pass on a retry
+TRANSIENT_ERROR_CODES = {
+    'InternalServerException',
+    'ServiceUnavailableException',
+    'ModelNotReadyException',
+}
+
+# Upper bound of the delay between retries of one item, in seconds
+MAX_RETRY_DELAY = 30
+
+
+def is_throttling_error(e):
+    return isinstance(e, ClientError) and e.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+
+def is_retryable_error(e):
+    """Throttling, 5xx and connection or read-timeout errors, anything else fails the same way again."""
+    if is_throttling_error(e):
+        return True
+    # Connect errors and timeouts, read timeouts and dropped connections
+    if isinstance(e, (BotoConnectionError, HTTPClientError)):
+        return True
+    if isinstance(e, ClientError):
+        if e.response.get('Error', {}).get('Code') in TRANSIENT_ERROR_CODES:
+            return True
+        return e.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0) >= 500
+    return False
+
+
+class TokenBucket:
+    """Rate limiter allowing `rate` calls per second with bursts up to `capacity`, rate <= 0 means unlimited."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit.
+
+    Every success raises the limit by 1/limit, which adds about one slot per
+    round of calls, and every throttled call halves it.
+    """
+
+    def __init__(self, initial, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+                logger.warning(f"Throttled, concurrency limit lowered to {int(self.limit)}")
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class EmbeddingScheduler:
+    """
+    Long-lived worker pool for embedding calls.
+
+    Calls are rate limited by a token bucket, concurrency adapts to throttling,
+    and each item is retried on its own with exponential backoff when the
+    error is throttling or transient, other errors are raised right away.
+    """
+
+    def __init__(self, max_concurrency=50, initial_concurrency=10, rate_per_second=0, max_retries=5):
+        self.max_retries = max_retries
+        self.bucket = TokenBucket(rate_per_second)
+        self.limiter = AdaptiveLimiter(initial_concurrency, 1, max_concurrency)
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix='embedding'
+        )
+
+    def submit(self, fn, item):
+        return self._executor.submit(self._run, fn, item)
+
+    def _run(self, fn, item):
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self.limiter.acquire()
+            try:
+                result = fn(item)
+            except Exception as e:
+                self.limiter.release(throttled=is_throttling_error(e))
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                delay = min(MAX_RETRY_DELAY, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"Embedding call failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.limiter.release()
+            return result
+
+    def stats(self):
+        return {
+            'concurrency_limit': int(self.limiter.limit),
+            'in_flight': self.limiter.in_flight,
+        }
@@ -1,17 +1,17 @@
 import requests
 import os
 import json
-import boto3
 import re
-from util.txt_process import clean_text
+from util.txt_process import clean_text, text_hash
+from models import bedrock
+from util.logger import get_logger
 _MODEL = None
 _MODEL_PATH = None
 
-BEDROCK_REGION = None
-BEDROCK_ACCESS_KEY_ID = None
-BEDROCK_SECRET_ACCESS_KEY = None
 BEDROCK_SUGGEST_MODEL_ID = None
 
+logger = get_logger(__name__)
+
 SYSTEM_PROMPT = """---
 **Role**
 You are the **Jira Issue Resolution Assistant**—an expert at troubleshooting Jira issues, fluent in both Traditional Chinese and English. Your goal is to provide concise, actionable solutions or suggestions based on the provided Jira issue description and comments.
@@ -74,14 +74,9 @@ def init():
     global _MODEL_PATH
     _MODEL_PATH = os.getenv('SUGGEST_MODEL_PATH')
     _MODEL = os.getenv('SUGGEST_MODEL')
-    global BEDROCK_REGION
-    global BEDROCK_ACCESS_KEY_ID
-    global BEDROCK_SECRET_ACCESS_KEY
     global BEDROCK_SUGGEST_MODEL_ID
-    BEDROCK_REGION = os.getenv('BEDROCK_REGION')
-    BEDROCK_ACCESS_KEY_ID = os.getenv('BEDROCK_ACCESS_KEY_ID')
-    BEDROCK_SECRET_ACCESS_KEY = os.getenv('BEDROCK_SECRET_ACCESS_KEY')
     BEDROCK_SUGGEST_MODEL_ID = os.getenv('BEDROCK_SUGGEST_MODEL_ID')
+    bedrock.register_model(BEDROCK_SUGGEST_MODEL_ID, 'suggestion')
 
 
 
@@ -108,15 +103,80 @@ def get_suggestion(text):
     return response_json['message']['content'] 
 
 
+def suggestion_cache_key(text):
+    """Key of a stored suggestion, it changes with the issue document and with the model."""
+    return text_hash(f"{BEDROCK_SUGGEST_MODEL_ID}:{text_hash(text)}")
+
+
 def get_suggestion_bedrock(text):
-    client = boto3.client(
-        service_name="bedrock-runtime",
-        region_name=BEDROCK_REGION,
-        aws_access_key_id=BEDROCK_ACCESS_KEY_ID,
-        aws_secret_access_key=BEDROCK_SECRET_ACCESS_KEY,
-    )
+    with bedrock.track('suggestion'):
+        response = bedrock.get_client().invoke_model(
+            modelId=BEDROCK_SUGGEST_MODEL_ID,
+            body=_request_body(text),
+            contentType="application/json",
+            accept="application/json"
+        )
+
+        # Read and parse the response
+        response_body = json.loads(response['body'].read().decode('utf-8'))
     
-    body = json.dumps({
+    # Extract the response text
+    response_text = ''
+    for content in response_body.get('content', []):
+        if content['type'] == 'text':
+            response_text += content['text']
+    
+    return format_suggestion(response_text)
+
+
+def stream_suggestion_bedrock(text):
+    """
+    Generate a suggestion and yield it piece by piece as the model writes it.
+
+    The pieces joined together equal what get_suggestion_bedrock returns. Text is
+    only yielded once more output can no longer change how it is formatted.
+
+    Returns:
+        str: The whole formatted suggestion, as the generator's return value.
+    """
+    # The call is timed until the stream ends
+    with bedrock.track('suggestion'):
+        return (yield from _stream_suggestion_bedrock(text))
+
+
+def _stream_suggestion_bedrock(text):
+    response = bedrock.get_client().invoke_model_with_response_stream(
+        modelId=BEDROCK_SUGGEST_MODEL_ID,
+        body=_request_body(text),
+        contentType="application/json",
+        accept="application/json"
+    )
+
+    raw = ''
+    emitted = ''
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if not chunk:
+            continue
+        data = json.loads(chunk['bytes'].decode('utf-8'))
+        if data.get('type') != 'content_block_delta' or data['delta'].get('type') != 'text_delta':
+            continue
+        raw += data['delta']['text']
+        formatted = format_suggestion(raw[:_stable_prefix_length(raw)])
+        if len(formatted) > len(emitted) and formatted.startswith(emitted):
+            yield formatted[len(emitted):]
+            emitted = formatted
+
+    formatted = format_suggestion(raw)
+    if not formatted.startswith(emitted):
+        logger.warning("Streamed suggestion differs from the final formatting")
+    elif len(formatted) > len(emitted):
+        yield formatted[len(emitted):]
+    return formatted
+
+
+def _request_body(text):
+    return json.dumps({
         "anthropic_version": "bedrock-2023-05-31",
         "max_tokens": 1000,
         "system": SYSTEM_PROMPT,
@@ -132,22 +192,8 @@ def get_suggestion_bedrock(text):
         "top_p": 0.9,
     })
 
-    response = client.invoke_model(
-        modelId=BEDROCK_SUGGEST_MODEL_ID,
-        body=body,
-        contentType="application/json",
-        accept="application/json"
-    )
 
-    # Read and parse the response
-    response_body = json.loads(response['body'].read().decode('utf-8'))
-    
-    # Extract the response text
-    response_text = ''
-    for content in response_body.get('content', []):
-        if content['type'] == 'text':
-            response_text += content['text']
-    
+def format_suggestion(response_text):
     # Clean up the response text
     response_text = clean_text(response_text)
     response_text = re.sub(r'\\n','\n', response_text)
@@ -155,3 +201,41 @@ def get_suggestion_bedrock(text):
     response_text = re.sub(r'Suggestion:','\n\nSuggestion:\n', response_text)
     
     return response_text
+
+
+def _stable_prefix_length(raw):
+    """
+    Length of the longest prefix of `raw` that formats the same way however the
+    text continues: it ends at whitespace, so URLs and markers are complete, and
+    its last line has no unclosed [ or <, which clean_text may still remove
+    together with anything after them.
+    """
+    end = len(raw)
+    while end > 0:
+        cut = end - 1
+        while cut >= 0 and not raw[cut].isspace():
+            cut -= 1
+        if cut <= 0:
+            return 0
+        opener = _first_unsettled_opener(raw[:cut])
+        if opener == -1:
+            return cut
+        end = opener
+    return 0
+
+
+def _first_unsettled_opener(text):
+    """
+    Position of the first [ or < on the last line of `text` when any [ or < on
+    that line is still unclosed, -1 when there is none.
+
+    clean_text's patterns don't match across lines, so only the last line can
+    still change. A later ] or > may close any unclosed opener, which removes
+    everything from the opener on, so text is held back from the earliest one.
+    """
+    start = text.rfind('\n') + 1
+    line = text[start:]
+    without_brackets = re.sub(r'\[.*?\]', '', line)
+    if '[' not in without_brackets and '<' not in re.sub(r'<.*?>', '', without_brackets):
+        return -1
+    return start + min(i for i in (line.find('['), line.find('<')) if i != -1)
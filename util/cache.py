@@ -0,0 +1,48 @@
+import threading
+
+
+class MetricsCache:
+    """
+    Thread-safe wrapper around a cachetools cache that counts hits and misses.
+
+    A cache with maxsize 0 is disabled, lookups always miss and nothing is stored.
+    """
+
+    def __init__(self, cache):
+        self._cache = cache
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._cache[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        if self._cache.maxsize <= 0:
+            return
+        with self._lock:
+            self._cache[key] = value
+
+    def pop(self, key):
+        with self._lock:
+            return self._cache.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._cache),
+                'maxsize': self._cache.maxsize,
+            }
@@ -0,0 +1,127 @@
+import os
+import time
+from contextlib import contextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from util.logger import get_logger
+
+logger = get_logger(__name__)
+
+# With several worker processes, counters and histograms are kept in files in this
+# directory and summed over the workers on every scrape. prometheus_client reads it
+# at import time too, see gunicorn.conf.py.
+MULTIPROCESS = bool(os.getenv('PROMETHEUS_MULTIPROC_DIR'))
+
+# Sync stages run from milliseconds (diff) to many minutes (embedding a full sync)
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+REQUEST_LATENCY = Histogram(
+    'issue_search_request_duration_seconds', 'HTTP request latency', ['method', 'route', 'status'])
+SYNC_STAGE_SECONDS = Histogram(
+    'issue_search_sync_stage_duration_seconds',
+    'Time spent per sync stage: fetch, diff, lookup, embed, upsert and the whole sync',
+    ['stage'], buckets=STAGE_BUCKETS)
+SYNC_ISSUES = Counter(
+    'issue_search_sync_issues_total', 'Issues fetched from Jira and issues found changed', ['result'])
+BEDROCK_CALLS = Counter(
+    'issue_search_bedrock_calls_total', 'Bedrock calls by outcome: ok, throttled or error', ['purpose', 'outcome'])
+BEDROCK_LATENCY = Histogram(
+    'issue_search_bedrock_call_duration_seconds', 'Bedrock call latency, including botocore retries',
+    ['purpose'], buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60, 120))
+BEDROCK_THROTTLED_ATTEMPTS = Counter(
+    'issue_search_bedrock_throttled_attempts_total', 'Bedrock attempts throttled, including ones botocore retried',
+    ['purpose'])
+CHROMA_LATENCY = Histogram(
+    'issue_search_chroma_operation_duration_seconds', 'Chroma read latency', ['operation'])
+
+# Read at scrape time: cache name -> function returning a dict with hits, misses and size or entries
+_CACHES = {}
+# Read at scrape time: metric name -> (help text, function returning a number)
+_GAUGES = {}
+
+
+def register_cache(name, stats):
+    _CACHES[name] = stats
+
+
+def register_gauge(name, documentation, value):
+    _GAUGES[name] = (documentation, value)
+
+
+@contextmanager
+def timed(histogram, *labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(*labels).observe(time.perf_counter() - start)
+
+
+def timed_iter(iterable, histogram, *labels):
+    """Yield from an iterable, observing how long each item took to produce."""
+    iterator = iter(iterable)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            histogram.labels(*labels).observe(time.perf_counter() - start)
+            yield item
+    finally:
+        if hasattr(iterator, 'close'):
+            iterator.close()
+
+
+class StatsCollector:
+    """
+    Exposes the registered cache stats and gauges, read when /metrics is scraped.
+
+    They live in the memory of each process. In multiprocess mode only the
+    worker serving the scrape is seen, so its values are labelled with its pid.
+    """
+
+    def __init__(self, per_process=False):
+        self.pid_labels = ['pid'] if per_process else []
+        self.pid_values = [str(os.getpid())] if per_process else []
+
+    def collect(self):
+        labels = ['cache'] + self.pid_labels
+        hits = CounterMetricFamily('issue_search_cache_hits', 'Cache hits', labels=labels)
+        misses = CounterMetricFamily('issue_search_cache_misses', 'Cache misses', labels=labels)
+        entries = GaugeMetricFamily('issue_search_cache_entries', 'Entries in the cache', labels=labels)
+        for name, stats in list(_CACHES.items()):
+            try:
+                values = stats()
+            except Exception as e:
+                logger.warning(f"Failed to read stats of cache {name}: {e}")
+                continue
+            hits.add_metric([name] + self.pid_values, values.get('hits', 0))
+            misses.add_metric([name] + self.pid_values, values.get('misses', 0))
+            entries.add_metric([name] + self.pid_values, values.get('size', values.get('entries', 0)))
+        yield hits
+        yield misses
+        yield entries
+
+        for name, (documentation, value) in list(_GAUGES.items()):
+            try:
+                gauge = GaugeMetricFamily(name, documentation, labels=self.pid_labels)
+                gauge.add_metric(self.pid_values, value())
+                yield gauge
+            except Exception as e:
+                logger.warning(f"Failed to read metric {name}: {e}")
+
+
+REGISTRY.register(StatsCollector())
+
+
+def latest():
+    """The current metrics in the Prometheus text format, with its content type."""
+    if MULTIPROCESS:
+        # Summed over every worker, not only the one serving this scrape
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(StatsCollector(per_process=True))
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -1,13 +1,22 @@
 import requests
+import httpx
 import json
-from typing import Optional, Dict, Any
+import hashlib
+from typing import Optional, Dict, Any, Tuple
+from cachetools import TLRUCache
+from requests.adapters import HTTPAdapter
 from scheme.token import TokenInfo, UserInfo
+from util.cache import MetricsCache
 from util.logger import get_logger
 
 # Constants equivalent to the Go code
 TOKEN_INFO_PATTERN = "{}/oauth/tokeninfo?access_token={}"
 HEADER_X_QNAP_APP_ID = "X-QNAP-APP-ID"
 DEFAULT_TIMEOUT = 5  # seconds
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_MAX_TTL = 300  # seconds
+DEFAULT_NEGATIVE_CACHE_TTL = 30  # seconds
+DEFAULT_POOL_SIZE = 20
 logger = get_logger(__name__)
 
 class TokenError(Exception):
@@ -16,42 +25,92 @@ class TokenError(Exception):
 
 
 class Token:
-    def __init__(self, auth_url: str, app_id: str):
+    def __init__(self, auth_url: str, app_id: str,
+                 cache_size: int = DEFAULT_CACHE_SIZE,
+                 cache_max_ttl: float = DEFAULT_CACHE_MAX_TTL,
+                 negative_cache_ttl: float = DEFAULT_NEGATIVE_CACHE_TTL):
         """
         Initialize the Token service.
         
         Args:
             auth_url: The OAuth authentication URL
             app_id: The application ID for the API
+            cache_size: Maximum number of cached token lookups, 0 disables the cache
+            cache_max_ttl: Upper bound in seconds for caching a valid token,
+                a token is never cached past its own expires_in
+            negative_cache_ttl: Seconds an invalid token is remembered as invalid
         """
         self.auth_url = auth_url
         self.app_id = app_id
+        self.cache_max_ttl = cache_max_ttl
+        self.negative_cache_ttl = negative_cache_ttl
+        # Entries are (result, ttl), each entry expires after its own ttl
+        self._cache = MetricsCache(TLRUCache(maxsize=cache_size, ttu=lambda _key, value, now: now + value[1]))
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=DEFAULT_POOL_SIZE)
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        # Created on first use, so it binds to the event loop that serves requests
+        self._async_client = None
     
     def get_token_info(self, access_token: str) -> (TokenInfo | str):
         """
-        Get token information from the OAuth server.
+        Get token information, from the cache when the token was seen recently.
         
         Args:
             access_token: The access token to validate
             
         Returns:
-            (TokenInfo | None, str): A tuple containing the token information and an error message
-            
-        Raises:
-            TokenError: If access_token is empty or if there's an error in the request
+            TokenInfo | str: The token information, or an error message
         """
         if not access_token:
             return  "access token is empty"
-        
+
+        # Do not keep raw tokens in memory longer than needed
+        cache_key = hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached[0]
+
+        result, ttl = self._fetch_token_info(access_token)
+        if ttl > 0:
+            self._cache.set(cache_key, (result, ttl))
+        return result
+
+    async def aget_token_info(self, access_token: str) -> (TokenInfo | str):
+        """
+        Async version of get_token_info, the OAuth server is called without blocking the event loop.
+        """
+        if not access_token:
+            return  "access token is empty"
+
+        cache_key = hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            return cached[0]
+
+        result, ttl = await self._afetch_token_info(access_token)
+        if ttl > 0:
+            self._cache.set(cache_key, (result, ttl))
+        return result
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+    def _fetch_token_info(self, access_token: str) -> Tuple[TokenInfo | str, float]:
+        """
+        Get token information from the OAuth server.
+
+        Returns:
+            (TokenInfo | str, float): The token information or an error message,
+                and how many seconds the result may be cached
+        """
         uri = TOKEN_INFO_PATTERN.format(self.auth_url, access_token)
         
         try:
-            response = requests.get(
+            response = self._session.get(
                 uri,
-                headers={
-                    "Authorization": f"Bearer {access_token}",
-                    HEADER_X_QNAP_APP_ID: self.app_id
-                },
+                headers=self._headers(access_token),
                 timeout=DEFAULT_TIMEOUT
             )
             
@@ -59,39 +118,81 @@ class Token:
             response.raise_for_status()
             
             # Parse the JSON response
-            result_dict = response.json()
-            
-            # Check for error in the response
-            if result_dict.get("error"):
-                return f"error in token info response"
-      
-            # Create TokenInfo object from response
-            token_info = TokenInfo(
-                client_id=result_dict.get("client_id"),
-                scope=result_dict.get("scope"),
-                expires_in=result_dict.get("expires_in"),
-                user=UserInfo(
-                    id=result_dict.get("user_id"),
-                    email=result_dict.get("user").get("email"),
-                    display_name=result_dict.get("user").get("display_name"),
-                )
-            )
-            
-            return token_info
+            return self._parse_token_info(response.json())
             
+        except requests.HTTPError as e:
+            # The auth server rejected the token, other failures are not cached
+            if e.response is not None and 400 <= e.response.status_code < 500:
+                return f"failed to get token info: {e}", self.negative_cache_ttl
+            return f"failed to get token info: {e}", 0
         except requests.RequestException as e:
-            return f"failed to get token info: {e}"
+            return f"failed to get token info: {e}", 0
+        except json.JSONDecodeError as e:
+            return f"failed to parse token info response:{e}", 0
+
+    async def _afetch_token_info(self, access_token: str) -> Tuple[TokenInfo | str, float]:
+        uri = TOKEN_INFO_PATTERN.format(self.auth_url, access_token)
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                timeout=DEFAULT_TIMEOUT,
+                limits=httpx.Limits(max_connections=DEFAULT_POOL_SIZE),
+            )
+
+        try:
+            response = await self._async_client.get(uri, headers=self._headers(access_token))
+            response.raise_for_status()
+            return self._parse_token_info(response.json())
+
+        except httpx.HTTPStatusError as e:
+            if 400 <= e.response.status_code < 500:
+                return f"failed to get token info: {e}", self.negative_cache_ttl
+            return f"failed to get token info: {e}", 0
+        except httpx.HTTPError as e:
+            return f"failed to get token info: {e}", 0
         except json.JSONDecodeError as e:
-            return f"failed to parse token info response:{e}"
+            return f"failed to parse token info response:{e}", 0
+
+    def _headers(self, access_token: str) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {access_token}",
+            HEADER_X_QNAP_APP_ID: self.app_id
+        }
+
+    def _parse_token_info(self, result_dict: Dict[str, Any]) -> Tuple[TokenInfo | str, float]:
+        # Check for error in the response
+        if result_dict.get("error"):
+            return f"error in token info response", self.negative_cache_ttl
+
+        # Create TokenInfo object from response
+        token_info = TokenInfo(
+            client_id=result_dict.get("client_id"),
+            scope=result_dict.get("scope"),
+            expires_in=result_dict.get("expires_in"),
+            user=UserInfo(
+                id=result_dict.get("user_id"),
+                email=result_dict.get("user").get("email"),
+                display_name=result_dict.get("user").get("display_name"),
+            )
+        )
+
+        return token_info, self._token_ttl(token_info)
+
+    def _token_ttl(self, token_info: TokenInfo) -> float:
+        try:
+            expires_in = float(token_info.expires_in)
+        except (TypeError, ValueError):
+            return self.cache_max_ttl
+        return max(0, min(expires_in, self.cache_max_ttl))
 
 
-def create_token_service(auth_url: str, app_id: str) -> Token:
+def create_token_service(auth_url: str, app_id: str, **cache_options) -> Token:
     """
     Create a new Token service instance.
     
     Args:
         auth_url: The OAuth authentication URL
         app_id: The application ID for the API
+        cache_options: cache_size, cache_max_ttl and negative_cache_ttl for Token
         
     Returns:
         A new Token service instance
@@ -102,4 +203,4 @@ def create_token_service(auth_url: str, app_id: str) -> Token:
     if not auth_url:
         raise TokenError("auth URL is empty")
     
-    return Token(auth_url, app_id)
+    return Token(auth_url, app_id, **cache_options)
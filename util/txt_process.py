@@ -1,5 +1,7 @@
 import pandas as pd
 import re
+import hashlib
+import json
 from util.logger import get_logger
 import concurrent.futures
 from datetime import datetime, timezone, timedelta
@@ -18,7 +20,7 @@ def clean_text(text):
     
     return text.strip()
 
-def document(rows):
+def document(rows, include_comments=True):
 
     rows_size = len(rows)
 
@@ -26,7 +28,8 @@ def document(rows):
         key = format_value(row.get('key', ''))
         summary = format_value(row.get('summary', ''))
         description = format_value(row.get('description', ''))
-        comment= format_value(row.get('comment',''))
+        # Left out when comments are stored as chunks of their own
+        comment= format_value(row.get('comment','')) if include_comments else ''
         return f"This is Issue ID: '{key}'; This is summary: '{summary}'; This is description: '{description}'; This is comments: '{comment}'"
 
     if rows_size == 1:
@@ -72,4 +75,24 @@ def format_time_to_txt(time):
     if not isinstance(time, (int, float)):
         return str(time)  # Return the string as is if it's not a numeric timestamp
     return datetime.fromtimestamp(time).strftime('%Y-%m-%d %H:%M:%S')
-    
\ No newline at end of file
+
+
+def text_hash(text):
+    return hashlib.sha256(str(text).encode('utf-8')).hexdigest()
+
+def fingerprint(issue):
+    """
+    Hash every issue field that is stored in the database, normalized the same
+    way as when it is written, so an unchanged issue always gets the same value.
+    """
+    fields = {
+        'status': issue.get('status'),
+        'summary': format_value(issue.get('summary')),
+        'description': format_value(issue.get('description')),
+        'created': format_time_to_iso(issue.get('created')),
+        'issuetype': issue.get('issuetype'),
+        'assignee': issue.get('assignee'),
+        'comment': issue.get('comment'),
+        'comment_num': issue.get('comment_num'),
+    }
+    return text_hash(json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str))
@@ -0,0 +1,16 @@
+"""
+WSGI entry point for multi-process servers:
+
+    LEADER_ELECTION=true gunicorn -w 4 --threads 8 -b 0.0.0.0:8080 wsgi:app
+
+Every worker starts the sync scheduler, only the elected leader syncs. Don't
+use --preload, the scheduler thread has to be started in each worker.
+"""
+import atexit
+from api import create_app
+from api.jira_issue.service import start_background_sync, stop_background_sync
+
+app = create_app()
+
+start_background_sync()
+atexit.register(stop_background_sync)